@@ -0,0 +1,277 @@
+"""Benchmarks: the physics (sprite methods and whole match steps), the render routines and whole frames, drawn with
+SDL's dummy video driver at several window sizes. Seeds and inputs are fixed, so runs are comparable: the results can
+be saved as JSON and later runs compared against them, failing when something got slower than a threshold.
+
+Usage: python benchmark.py [--only PREFIX] [--sizes 800x600,1500x1000] [--scale 1]
+                           [--save results.json] [--baseline results.json] [--threshold 0.1]"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from fixedpoint import FixedMatch
+from multiball import MultiBallMatch
+from simulation import Ball, Direction, Match, Paddle, Vector, constant_delta, impossible_ai
+
+# no window, no sound device, whatever the machine has
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+default_sizes = ((800, 600), (1500, 1000), (2560, 1440))
+frame_time = 1000 / 60
+input_script = [Direction.Up] * 40 + [None] * 20 + [Direction.Down] * 40 + [None] * 20
+
+
+def scripted_input(step):
+    """The right player's input on each step: up, wait, down, wait, and over again."""
+    return input_script[step % len(input_script)]
+
+
+def best_time(benchmark, number, repeat):
+    """Seconds per call of the fastest of repeat runs. benchmark(number) does its own setup and returns how many seconds
+    number calls took."""
+    return min(benchmark(number) for _ in range(repeat)) / number
+
+
+def sprite_update(number):
+    ball = Ball(random.Random(0))
+    ball.speed = Vector(0.03, 0.02)
+    start = time.perf_counter()
+    for _ in range(number):
+        ball.update(constant_delta)
+    return time.perf_counter() - start
+
+
+def collides(number):
+    ball, paddle = Ball(random.Random(0)), Paddle(170)
+    ball.position = paddle.position
+    far = Ball(random.Random(0))
+    start = time.perf_counter()
+    for _ in range(number // 2):
+        ball.collides(paddle)
+        far.collides(paddle)
+    return time.perf_counter() - start
+
+
+def bounce(number):
+    ball = Ball(random.Random(0))
+    ball.speed = Vector(0.03, 0.02)
+    start = time.perf_counter()
+    for _ in range(number // 4):
+        ball.bounce(0)
+        ball.bounce(85)
+        ball.bounce(90)
+        ball.bounce(100)
+    return time.perf_counter() - start
+
+
+def reflection_angle(number):
+    paddle = Paddle(170)
+    # every part, from a ball just touching the top to one just touching the bottom
+    offsets = [offset - 0.5 for offset in range(paddle.size.height + 1)]
+    start = time.perf_counter()
+    for _ in range(number // len(offsets)):
+        for offset in offsets:
+            paddle.reflection_angle(offset)
+    return time.perf_counter() - start
+
+
+def match_steps(left_control, match_class=Match):
+    def benchmark(number):
+        match = match_class(seed=0)
+        start = time.perf_counter()
+        for step in range(number):
+            left_direction = left_control(match.left_paddle, match.ball) if left_control else None
+            match.step(left_direction, scripted_input(step))
+        return time.perf_counter() - start
+    return benchmark
+
+
+def fast_forward(number):
+    """A frame's worth of fast forward per call, with the inputs of the frame's first step."""
+    match = Match(seed=0)
+    start = time.perf_counter()
+    for frame in range(number):
+        match.fast_forward(frame_time, impossible_ai(match.left_paddle, match.ball),
+                           scripted_input(int(frame * frame_time // constant_delta)))
+    return time.perf_counter() - start
+
+
+def snapshot_restore(match_class):
+    """A rollback's worth of bookkeeping: a snapshot per call and a restore of it."""
+    def benchmark(number):
+        match = match_class(seed=0)
+        for step in range(100):
+            match.step(None, scripted_input(step))
+        start = time.perf_counter()
+        for _ in range(number):
+            match.restore(match.snapshot())
+        return time.perf_counter() - start
+    return benchmark
+
+
+def multiball_steps(balls):
+    def benchmark(number):
+        match = MultiBallMatch(balls, seed=0)
+        start = time.perf_counter()
+        for step in range(number):
+            match.step(impossible_ai(match.left_paddle, match.ball), scripted_input(step))
+        return time.perf_counter() - start
+    return benchmark
+
+
+physics_benchmarks = [
+    ('physics.sprite_update', sprite_update, 200000),
+    ('physics.collides', collides, 200000),
+    ('physics.bounce', bounce, 100000),
+    ('physics.reflection_angle', reflection_angle, 100000),
+    ('physics.step', match_steps(None), 50000),
+    ('physics.step_ai', match_steps(impossible_ai), 50000),
+    ('physics.fast_forward_frame', fast_forward, 20000),
+    ('physics.fixed_step', match_steps(None, FixedMatch), 50000),
+    ('physics.snapshot_restore', snapshot_restore(Match), 50000),
+    ('physics.fixed_snapshot_restore', snapshot_restore(FixedMatch), 50000),
+    ('physics.multiball_step_400', multiball_steps(400), 500),
+]
+
+
+def open_window(pong, size, upscale=1, balls=0):
+    """Point the renderer at a new window of size, or a framebuffer upscale times smaller, and a fresh seeded match
+    (with extra balls), with nothing drawn yet."""
+    pong.screen, pong.upscale = None, 1
+    if upscale > 1:
+        pong.use_framebuffer(pong.init_window(size), upscale)
+    else:
+        pong.use_surface(pong.init_window(size))
+    pong.match = MultiBallMatch(balls, seed=0) if balls else Match(seed=0)
+    pong.drawn_rects.clear()
+    pong.draw_background()
+
+
+def render_benchmarks(size):
+    import pong
+
+    def setup():
+        if (pong.win_w, pong.win_h) != size or pong.screen is not None:
+            open_window(pong, size)
+
+    def draw_score(number):
+        setup()
+        pong.match.score = [7, 11]
+        start = time.perf_counter()
+        for _ in range(number):
+            pong.draw_score()
+        return time.perf_counter() - start
+
+    def draw_half_line(number):
+        setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            pong.draw_half_line(pong.window)
+        return time.perf_counter() - start
+
+    def draw_paddle_parts(number):
+        setup()
+        pong.show_parts = True
+        start = time.perf_counter()
+        for _ in range(number):
+            pong.draw_paddle(pong.match.right_paddle, 0.5)
+        elapsed = time.perf_counter() - start
+        pong.show_parts = False
+        return elapsed
+
+    def frame(number, upscale=1, balls=0):
+        """The main loop's work for a frame at 60 FPS: clear, step, draw and update the display."""
+        open_window(pong, size, upscale, balls)
+        pong.present([pong.window.get_rect()])
+        match = pong.match
+        accumulator = 0
+        step = 0
+        start = time.perf_counter()
+        for _ in range(number):
+            rects = pong.clear_frame()
+            accumulator += frame_time
+            while accumulator >= match.delta:
+                accumulator -= match.delta
+                match.step(impossible_ai(match.left_paddle, match.ball), scripted_input(step))
+                step += 1
+            rects += pong.draw_frame(accumulator / match.delta)
+            pong.present(rects)
+        return time.perf_counter() - start
+
+    suffix = '.{}x{}'.format(*size)
+    return [
+        ('render.draw_score' + suffix, draw_score, 5000),
+        ('render.draw_half_line' + suffix, draw_half_line, 2000),
+        ('render.draw_paddle_parts' + suffix, draw_paddle_parts, 5000),
+        ('frame' + suffix, frame, 1000),
+        ('frame.upscale4' + suffix, lambda number: frame(number, 4), 1000),
+        ('frame.multiball400' + suffix, lambda number: frame(number, balls=400), 100),
+    ]
+
+
+def run(benchmarks, scale, repeat, only):
+    results = {}
+    for name, benchmark, number in benchmarks:
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = best_time(benchmark, max(1, int(number * scale)), repeat)
+        print('{:40} {:12.3f} us {:14.0f} /s'.format(name, results[name] * 1e6, 1 / results[name]))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Report lines for the benchmarks in both runs and the names of those that take more than threshold longer."""
+    lines, regressions = [], []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        change = results[name] / baseline[name] - 1
+        if change > threshold:
+            regressions.append(name)
+        lines.append('{:40} {:+7.1%}{}'.format(name, change, '  REGRESSION' if change > threshold else ''))
+    return lines, regressions
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Pong benchmarks')
+    parser.add_argument('--only', action='append', metavar='PREFIX',
+                        help='only run the benchmarks whose names start with PREFIX (physics, render, frame...)')
+    parser.add_argument('--sizes', type=lambda text: [parse_size(size) for size in text.split(',')],
+                        default=default_sizes, help='window sizes for the render and frame benchmarks, like 800x600,1500x1000')
+    parser.add_argument('--scale', type=float, default=1, help='multiply the number of calls of every benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each benchmark, the fastest is reported')
+    parser.add_argument('--save', metavar='JSON', help='save the results')
+    parser.add_argument('--baseline', metavar='JSON', help='compare the results with ones saved before')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fail when a benchmark takes more than this fraction longer than the baseline')
+    args = parser.parse_args(argv[1:])
+    benchmarks = list(physics_benchmarks)
+    if not args.only or any(not prefix.startswith('physics') for prefix in args.only):
+        for size in args.sizes:
+            benchmarks += render_benchmarks(size)
+    results = run(benchmarks, args.scale, args.repeat, args.only)
+    if args.save:
+        with open(args.save, 'w') as json_file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      json_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as json_file:
+            lines, regressions = compare(results, json.load(json_file)['results'], args.threshold)
+        print('\n'.join(['', 'compared to {}:'.format(args.baseline)] + lines))
+        if regressions:
+            print('{} regression(s) over {:.0%}'.format(len(regressions), args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,122 @@
+"""Frame capture: records the rendered frames of a surface to disk without holding up the game.
+
+The only work on the game thread is one copy of the surface's pixels, straight from its buffer into one of a ring of
+frame buffers allocated up front. A background thread writes the full buffers out, as raw video or as a PNG sequence,
+and hands them back. When it can't keep up and every buffer is full, frames are dropped instead of waiting for it.
+
+Raw video is the pixels as they are, one frame after another, for example for ffmpeg:
+    ffmpeg -f rawvideo -pix_fmt bgr0 -video_size 1500x1000 -framerate 120 -i capture.raw capture.mp4
+(close() returns the exact command.) Frames are captured when they are rendered, so the frame rate is the pacer's.
+
+PNGs are compressed with zlib directly rather than pygame.image.save, which holds the GIL, and the game with it, for the
+whole encoding."""
+import os
+import queue
+import struct
+import threading
+import zlib
+
+import pygame
+
+# byte order of the 32 bit pixel formats, by the shifts of their red, green and blue: the pix_fmt of ffmpeg and the
+# format of pygame.image.frombuffer
+pixel_formats = {
+    (16, 8, 0): ('bgr0', 'BGRA'),
+    (0, 8, 16): ('rgb0', 'RGBX'),
+}
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def png_bytes(rgb, size):
+    """A PNG file of 24 bit RGB pixels."""
+    width, height = size
+    stride = width * 3
+    rows = memoryview(rgb)
+    # every row starts with its filter type, none
+    raw = b''.join(b'\x00' + rows[y * stride:(y + 1) * stride] for y in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            png_chunk(b'IDAT', zlib.compress(raw, 6)) + png_chunk(b'IEND', b''))
+
+
+class FrameCapture(object):
+    """Capture every nth frame of surface to path: raw video, or a PNG sequence if path ends with .png (frame numbers
+    are added to the name). slots is the number of frame buffers."""
+
+    def __init__(self, surface, path, every=1, slots=8):
+        shifts = surface.get_shifts()[:3]
+        if surface.get_bytesize() != 4 or surface.get_pitch() != surface.get_width() * 4 or shifts not in pixel_formats:
+            raise ValueError('Cannot capture {} bit surfaces with shifts {}'.format(surface.get_bitsize(), shifts))
+        self.surface = surface
+        self.path = path
+        self.every = every
+        self.size = surface.get_size()
+        self.pix_fmt, self.image_format = pixel_formats[shifts]
+        self.png = path.lower().endswith('.png')
+        self.frames = 0
+        self.written = 0
+        self.dropped = 0
+        self.buffers = [bytearray(surface.get_pitch() * surface.get_height()) for _ in range(slots)]
+        self.free = queue.Queue()
+        for index in range(slots):
+            self.free.put(index)
+        self.full = queue.Queue()
+        self.error = None
+        self.output = None if self.png else open(path, 'wb')
+        self.writer = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+
+    def capture(self):
+        """Call after each rendered frame."""
+        self.frames += 1
+        if (self.frames - 1) % self.every:
+            return
+        try:
+            index = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        # the surface stays locked as long as the view exists
+        view = self.surface.get_buffer()
+        memoryview(self.buffers[index])[:] = view
+        del view
+        self.full.put((index, self.frames))
+
+    def write_frames(self):
+        while True:
+            item = self.full.get()
+            if item is None:
+                return
+            index, frame = item
+            try:
+                if self.error is None:
+                    self.write(self.buffers[index], frame)
+                    self.written += 1
+            except (OSError, pygame.error) as error:
+                self.error = error
+            self.free.put(index)
+
+    def write(self, pixels, frame):
+        if not self.png:
+            self.output.write(pixels)
+            return
+        root, extension = os.path.splitext(self.path)
+        with open('{}{:06}{}'.format(root, frame, extension), 'wb') as png:
+            png.write(png_bytes(pygame.image.tobytes(pygame.image.frombuffer(pixels, self.size, self.image_format),
+                                                     'RGB'), self.size))
+
+    def close(self):
+        """Wait for the frames captured to be written, returns a summary."""
+        self.full.put(None)
+        self.writer.join()
+        if self.output is not None:
+            self.output.close()
+        if self.error is not None:
+            return 'capture failed: {}'.format(self.error)
+        summary = '{} frames captured to {}, {} dropped'.format(self.written, self.path, self.dropped)
+        if not self.png:
+            summary += '\nffmpeg -f rawvideo -pix_fmt {} -video_size {}x{} -i {} capture.mp4'.format(
+                self.pix_fmt, self.size[0], self.size[1], self.path)
+        return summary
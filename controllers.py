@@ -0,0 +1,112 @@
+"""Paddle controllers. A controller is called as control(paddle, ball) before every physics step and returns the
+direction to move its paddle in, a Direction or None to stand still, as Match.run expects.
+
+Controllers are made by name with make(name), so they can be picked on the command line or created in another process,
+and every match gets its own: a controller may keep state from one step to the next."""
+import random
+
+from simulation import Direction, bottom_limit, center, constant_delta, field_size, impossible_ai, top_limit
+
+
+def towards(paddle, target_y, dead_zone):
+    """The direction that brings the paddle's center to target_y, None once it's within dead_zone of it."""
+    paddle_center = center(paddle.y, paddle.height)
+    if paddle_center < target_y - dead_zone:
+        return Direction.Down
+    elif paddle_center > target_y + dead_zone:
+        return Direction.Up
+    return None
+
+
+def still(paddle, ball):
+    return None
+
+
+def follower(dead_zone):
+    """Follow the ball. impossible_ai is a follower(1.3)."""
+    def control(paddle, ball):
+        return towards(paddle, center(ball.y, ball.height), dead_zone)
+    return control
+
+
+def defender(dead_zone):
+    """Follow the ball only while it comes towards the paddle, otherwise go back to the middle."""
+    def control(paddle, ball):
+        if ball.speed_x != 0 and (ball.x < paddle.x) == (ball.speed_x > 0):
+            return towards(paddle, center(ball.y, ball.height), dead_zone)
+        return towards(paddle, field_size.height / 2, dead_zone)
+    return control
+
+
+def intercept_y(ball, x):
+    """The y the ball will be at when its left side reaches x, bouncing off the top and bottom walls on the way, or
+    None if it's not heading there. Bounces off the walls are mirror images, so this is a closed form: unfolding them,
+    the ball moves in a straight line through copies of the field stacked on top of each other."""
+    if ball.speed_x == 0:
+        return None
+    time = (x - ball.x) / ball.speed_x
+    if time < 0:
+        return None
+    low, high = top_limit, bottom_limit - ball.height
+    span = high - low
+    y = (ball.y - low + ball.speed_y * time) % (2 * span)
+    if y > span:
+        y = 2 * span - y
+    return low + y
+
+
+class Predictor(object):
+    """Go to where the ball will reach the paddle and wait for it there, or back to the middle while it goes away.
+
+    The prediction is only made again when the ball changes course (its speed_changes), so a step costs the same
+    however many bounces lie ahead. Difficulty comes from reaction, the milliseconds it takes to act on a new
+    prediction, and error, the standard deviation of the prediction's error in field units."""
+
+    def __init__(self, reaction=0, error=0, dead_zone=1.3, seed=0):
+        self.reaction_steps = int(round(reaction / constant_delta))
+        self.error = error
+        self.dead_zone = dead_zone
+        self.rng = random.Random(seed)
+        self.speed_changes = None
+        self.target_y = field_size.height / 2
+        self.next_target_y = None
+        self.wait = 0
+
+    def predict(self, paddle, ball):
+        if ball.x < paddle.x:
+            y = intercept_y(ball, paddle.x - ball.width)
+        else:
+            y = intercept_y(ball, paddle.x + paddle.width)
+        if y is None:
+            return field_size.height / 2
+        return center(y, ball.height) + (self.rng.gauss(0, self.error) if self.error else 0)
+
+    def __call__(self, paddle, ball):
+        if ball.speed_changes != self.speed_changes:
+            self.speed_changes = ball.speed_changes
+            self.next_target_y = self.predict(paddle, ball)
+            self.wait = self.reaction_steps
+        if self.next_target_y is not None:
+            if self.wait > 0:
+                self.wait -= 1
+            else:
+                self.target_y, self.next_target_y = self.next_target_y, None
+        return towards(paddle, self.target_y, self.dead_zone)
+
+
+factories = {
+    'still': lambda: still,
+    'impossible': lambda: impossible_ai,
+    'loose': lambda: follower(4),
+    'defender': lambda: defender(1.3),
+    'predictor': lambda: Predictor(),
+    'predictor_medium': lambda: Predictor(reaction=150, error=3),
+    'predictor_easy': lambda: Predictor(reaction=400, error=8),
+}
+
+
+def make(name):
+    """A new controller of the kind name."""
+    if name not in factories:
+        raise ValueError('Unknown controller {}, choose from {}'.format(name, ', '.join(sorted(factories))))
+    return factories[name]()
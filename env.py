@@ -0,0 +1,192 @@
+"""Reinforcement learning environment: a Match as a Gym style environment, with reset() and step(action), one physics
+step per action and no clock or display, so it runs as fast as the physics.
+
+The agent plays one paddle, a controller (see controllers.py) the other. Actions are 0 to stand still, 1 to go up and 2
+to go down (the codes of recording.directions). The reward is 1 when the agent scores and -1 when the opponent does; an
+episode terminates when somebody wins and is truncated after max_steps.
+
+Observations are NumPy arrays, either the state:
+    ball x, y, speed x, speed y, own paddle y, speed y, opponent paddle y, speed y, own score, opponent score,
+    ball in play
+positions in field units, speeds in field units per step and scores out of winning_score. Between a goal and the kick
+off the ball is out of the field, its values are then zeros and ball in play is 0 instead of 1. Or the pixels of the
+field drawn in gray on a pygame surface, pixel_scale pixels per field unit, as an (height, width) array of bytes. Both
+are mirrored for the right side, so the agent always sees itself on the left.
+
+VecEnv steps many independent matches per call and returns their observations, rewards and ends as arrays. With
+fixed_point the matches are FixedMatches, whose episodes replay exactly from their seeds on any machine.
+
+Usage (measures the steps per second with random actions):
+    python env.py [--envs 16] [--observation pixels] [--fixed-point]"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+import pygame
+
+import controllers
+import recording
+from fixedpoint import FixedMatch
+from simulation import Match, field_size, winning_score
+
+observation_types = ('state', 'pixels')
+state_size = 11
+
+
+class PongEnv(object):
+    """side is the paddle the agent plays, opponent the name of the controller of the other one and seed the seed of
+    the seeds of the matches played."""
+
+    def __init__(self, side='left', opponent='impossible', observation='state', pixel_scale=1, max_steps=14400,
+                 seed=None, fixed_point=False):
+        if side not in ('left', 'right'):
+            raise ValueError('Unknown side {}, choose left or right'.format(side))
+        if observation not in observation_types:
+            raise ValueError('Unknown observation {}, choose from {}'.format(observation, ', '.join(observation_types)))
+        controllers.make(opponent)
+        self.side = side
+        self.opponent = opponent
+        self.observation = observation
+        self.pixel_scale = pixel_scale
+        self.max_steps = max_steps
+        self.match_class = FixedMatch if fixed_point else Match
+        self.rng = random.Random(seed)
+        if observation == 'state':
+            self.observation_shape = (state_size,)
+            self.observation_dtype = np.float32
+        else:
+            self.observation_shape = (int(field_size.height * pixel_scale), int(field_size.width * pixel_scale))
+            self.observation_dtype = np.uint8
+            self.surface = pygame.Surface(self.observation_shape[::-1], 0, 32)
+        self.match = None
+
+    def reset(self, seed=None):
+        """Start a new match, returns the observation and an info dict."""
+        self.match = self.match_class(seed=self.rng.randrange(2 ** 64) if seed is None else seed)
+        self.control = controllers.make(self.opponent)
+        if self.side == 'left':
+            self.paddle, self.opponent_paddle = self.match.left_paddle, self.match.right_paddle
+        else:
+            self.paddle, self.opponent_paddle = self.match.right_paddle, self.match.left_paddle
+        return self.observe(), self.info()
+
+    def step(self, action):
+        """Take one physics step, returns the observation, the reward, whether the match ended and whether it was cut
+        short, and an info dict."""
+        reward, terminated, truncated = self.advance(action)
+        return self.observe(), reward, terminated, truncated, self.info()
+
+    def advance(self, action):
+        """step() without the observation."""
+        match = self.match
+        before = match.score
+        direction = recording.directions[action]
+        opponent_direction = self.control(self.opponent_paddle, match.ball)
+        if self.side == 'left':
+            match.step(direction, opponent_direction)
+        else:
+            match.step(opponent_direction, direction)
+        own, opponent = (0, 1) if self.side == 'left' else (1, 0)
+        reward = (match.score[own] - before[own]) - (match.score[opponent] - before[opponent])
+        return reward, match.showing_winner_screen, match.step_count >= self.max_steps
+
+    def info(self):
+        score = self.match.score if self.side == 'left' else self.match.score[::-1]
+        return {'score': score, 'steps': self.match.step_count}
+
+    def observe(self, out=None):
+        """The observation, written into out if given."""
+        if out is None:
+            out = np.empty(self.observation_shape, self.observation_dtype)
+        if self.observation == 'state':
+            self.observe_state(out)
+        else:
+            self.observe_pixels(out)
+        return out
+
+    def observe_state(self, out):
+        match, ball, paddle, opponent_paddle = self.match, self.match.ball, self.paddle, self.opponent_paddle
+        delta = match.delta
+        score = match.score if self.side == 'left' else match.score[::-1]
+        if match.delaying_kick_off:
+            x = y = speed_x = speed_y = in_play = 0
+        elif self.side == 'left':
+            x, y, speed_x, speed_y, in_play = ball.x, ball.y, ball.speed_x * delta, ball.speed_y * delta, 1
+        else:
+            x, y, speed_x, speed_y, in_play = (field_size.width - ball.width - ball.x, ball.y, -ball.speed_x * delta,
+                                               ball.speed_y * delta, 1)
+        out[:] = (x, y, speed_x, speed_y, paddle.y, paddle.speed_y * delta,
+                  opponent_paddle.y, opponent_paddle.speed_y * delta,
+                  score[0] / winning_score, score[1] / winning_score, in_play)
+
+    def observe_pixels(self, out):
+        surface, scale = self.surface, self.pixel_scale
+        surface.fill((0, 0, 0))
+        for sprite, color in ((self.opponent_paddle, 128), (self.paddle, 192), (self.match.ball, 255)):
+            surface.fill((color, color, color), (int(sprite.x * scale), int(sprite.y * scale),
+                                                 max(1, int(sprite.width * scale)), max(1, int(sprite.height * scale))))
+        # a view of the surface's pixels, indexed x then y
+        pixels = pygame.surfarray.pixels_red(surface)
+        out[:] = pixels.T if self.side == 'left' else pixels.T[:, ::-1]
+        del pixels
+
+
+class VecEnv(object):
+    """n PongEnvs, seeded from seed, stepped together. A match that ends is reset right away, the observation returned
+    for it is then the new match's first one."""
+
+    def __init__(self, n, seed=None, **kwargs):
+        rng = random.Random(seed)
+        self.envs = [PongEnv(seed=rng.randrange(2 ** 64), **kwargs) for _ in range(n)]
+        first = self.envs[0]
+        self.observations = np.empty((n,) + first.observation_shape, first.observation_dtype)
+        self.rewards = np.zeros(n, np.float32)
+        self.terminated = np.zeros(n, bool)
+        self.truncated = np.zeros(n, bool)
+
+    def reset(self):
+        for index, env in enumerate(self.envs):
+            env.reset()
+            env.observe(self.observations[index])
+        return self.observations
+
+    def step(self, actions):
+        """Take a step in every match with its action, returns the observations, rewards, terminated and truncated
+        arrays. They are reused by the next step."""
+        observations, rewards, terminated, truncated = self.observations, self.rewards, self.terminated, self.truncated
+        for index, env in enumerate(self.envs):
+            reward, terminated[index], truncated[index] = env.advance(int(actions[index]))
+            rewards[index] = reward
+            if terminated[index] or truncated[index]:
+                env.reset()
+            env.observe(observations[index])
+        return observations, rewards, terminated, truncated
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Pong environment throughput')
+    parser.add_argument('--envs', type=int, default=16)
+    parser.add_argument('--observation', choices=observation_types, default='state')
+    parser.add_argument('--opponent', default='impossible', choices=sorted(controllers.factories))
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fixed-point', action='store_true', help='Use the fixed-point physics')
+    args = parser.parse_args(argv[1:])
+    envs = VecEnv(args.envs, seed=0, observation=args.observation, opponent=args.opponent,
+                   fixed_point=args.fixed_point)
+    envs.reset()
+    rng = np.random.default_rng(0)
+    steps = episodes = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        _, _, terminated, truncated = envs.step(rng.integers(0, 3, args.envs))
+        steps += args.envs
+        episodes += int(terminated.sum() + truncated.sum())
+    elapsed = time.perf_counter() - start
+    print('{} steps in {:.2f} s: {:.0f} steps/s, {:.1f} M steps/h, {} episodes'.format(
+        steps, elapsed, steps / elapsed, steps / elapsed * 3600 / 1e6, episodes))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
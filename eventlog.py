@@ -0,0 +1,129 @@
+"""Structured game event log: bounces, goals, kick offs, resets, speed changes and pauses as fixed size binary records.
+
+Logging an event packs it into a ring of records allocated up front, nothing more: a background thread writes the new
+records to the file in batches. If it falls behind by a whole ring, the oldest records are lost (and counted) rather
+than making the game wait. A Match only logs if its event_log is set, so with the log off it costs one attribute check
+per event.
+
+Usage (prints a log as text): python eventlog.py LOG"""
+import struct
+import sys
+import threading
+from collections import namedtuple
+
+header = struct.Struct('<7sB')
+magic = b'PONGLOG'
+version = 1
+# virtual time, kind and up to five values
+record = struct.Struct('<dB3x5f')
+bounce, goal, kick_off, reset, speed, pause = range(6)
+kinds = {
+    bounce: ('bounce', ('angle', 'speed_x', 'speed_y', 'new_speed_x', 'new_speed_y')),
+    goal: ('goal', ('left', 'right')),
+    kick_off: ('kick_off', ('x', 'y', 'speed_x', 'speed_y')),
+    reset: ('reset', ()),
+    speed: ('speed', ('multiplier',)),
+    pause: ('pause', ('paused',)),
+}
+
+Event = namedtuple('Event', 'time kind values')
+
+
+class EventLog(object):
+    """A log written to path, capacity records in memory, flushed every interval seconds."""
+
+    def __init__(self, path, capacity=4096, interval=0.25):
+        self.capacity = capacity
+        self.interval = interval
+        self.buffer = bytearray(record.size * capacity)
+        # records logged and records written (or lost) so far
+        self.head = 0
+        self.tail = 0
+        self.lost = 0
+        self.file = open(path, 'wb')
+        self.file.write(header.pack(magic, version))
+        self.stopped = threading.Event()
+        self.writer = threading.Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+
+    def log(self, kind, time, a=0, b=0, c=0, d=0, e=0):
+        record.pack_into(self.buffer, self.head % self.capacity * record.size, time, kind, a, b, c, d, e)
+        self.head += 1
+
+    def bounce(self, time, angle, speed_x, speed_y, new_speed_x, new_speed_y):
+        self.log(bounce, time, angle, speed_x, speed_y, new_speed_x, new_speed_y)
+
+    def goal(self, time, score):
+        self.log(goal, time, score[0], score[1])
+
+    def kick_off(self, time, ball):
+        self.log(kick_off, time, ball.x, ball.y, ball.speed_x, ball.speed_y)
+
+    def reset(self, time):
+        self.log(reset, time)
+
+    def speed(self, time, multiplier):
+        self.log(speed, time, multiplier)
+
+    def pause(self, time, paused):
+        self.log(pause, time, paused)
+
+    def write_records(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        head = self.head
+        start = max(self.tail, head - self.capacity)
+        first, last = start % self.capacity * record.size, head % self.capacity * record.size
+        if head == start:
+            return
+        if first < last:
+            data = bytes(self.buffer[first:last])
+        else:
+            data = bytes(self.buffer[first:]) + bytes(self.buffer[:last])
+        # the game may have wrapped around and be overwriting records while they were copied
+        overwritten = self.head - self.capacity + 1
+        if overwritten > start:
+            data = data[(overwritten - start) * record.size:]
+            start = overwritten
+        self.lost += start - self.tail
+        self.file.write(data)
+        self.tail = head
+
+    def close(self):
+        """Write the rest of the records and close the file, returns a summary."""
+        self.stopped.set()
+        self.writer.join()
+        self.file.close()
+        return '{} events logged to {}, {} lost'.format(self.head, self.file.name, self.lost)
+
+
+def read(path):
+    """The Events of a log."""
+    with open(path, 'rb') as log_file:
+        file_magic, file_version = header.unpack(log_file.read(header.size))
+        if file_magic != magic or file_version != version:
+            raise ValueError('{} is not a pong event log'.format(path))
+        while True:
+            data = log_file.read(record.size)
+            if len(data) < record.size:
+                return
+            time, kind, *values = record.unpack(data)
+            name, fields = kinds[kind]
+            yield Event(time, name, dict(zip(fields, values)))
+
+
+def main(argv):
+    if len(argv) != 2:
+        print(__doc__.splitlines()[-1])
+        return 2
+    for event in read(argv[1]):
+        print('{:12.2f} {:9} {}'.format(event.time, event.kind, ' '.join(
+            '{}={:.4g}'.format(field, value) for field, value in event.values.items())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,301 @@
+"""Deterministic fixed point physics: FixedMatch plays by the rules of Match, but with positions in 1/65536ths of a
+field unit and speeds in those units per step, all Python integers. Integer arithmetic is exact and the reflections
+are an integer table, so there is no rounding that could differ from one machine, C library or Python build to
+another: the same seed and inputs give bit identical matches everywhere, which replays and lockstep network play rely
+on. The floating point Match only matches itself on the same platform (math.cos and friends come from the C library).
+
+The random numbers come from SplitMix64 in integers too, rather than random.Random whose ranged methods are only
+promised to repeat on the same Python version. Its state is a single integer, so the whole state is a handful of
+integers and state() packs them in an array: snapshots are cheap, two states compare with == and state_hash() digests
+them to check two peers or runs against each other.
+
+A FixedMatch is a Match whose bodies are Bodies: the rules (Match.step and the methods it calls) are shared and only
+the numbers and the arithmetic differ. It keeps its ball and paddles (the Sprites everything else reads) up to date
+with float copies of its bodies after every change, so it can be drawn, controlled, recorded and played over the
+network like a Match. Its time is 1/65536ths of a step, kick off delays included, and fast_forward takes the steps one
+by one."""
+import hashlib
+import math
+import random
+import struct
+from array import array
+
+from simulation import (Direction, Match, Paddle, Position, bottom_limit, center, constant_delta, field_size, hidden,
+                        left_limit, right_limit, top_limit)
+
+# position units per field unit and time units per step
+one = 1 << 16
+step_time = 1 << 16
+never = 1 << 62
+
+# (cos, sin) of twice the surface angle times 2 ** 30, the reflection matrices of Sprite.bounce: rounded once and
+# written out, so no math library is involved
+trig_bits = 30
+reflections = {
+    0: (1073741824, 0),
+    80: (-1008987269, 367241333),
+    85: (-1057429273, 186453311),
+    90: (-1073741824, 0),
+    95: (-1057429273, -186453311),
+    100: (-1008987269, -367241333),
+}
+
+
+class SplitMix64(object):
+    """A tiny random generator with a 64 bit integer state, the same sequence on every platform and Python version."""
+    mask = (1 << 64) - 1
+
+    def __init__(self, seed=None):
+        self.state = (random.getrandbits(64) if seed is None else seed) & self.mask
+
+    def next(self):
+        mask = self.mask
+        self.state = z = (self.state + 0x9e3779b97f4a7c15) & mask
+        z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9 & mask
+        z = (z ^ (z >> 27)) * 0x94d049bb133111eb & mask
+        return z ^ (z >> 31)
+
+    def below(self, n):
+        """An integer from 0 to n - 1, by multiply and shift."""
+        return self.next() * n >> 64
+
+    def randrange(self, start, stop=None):
+        if stop is None:
+            start, stop = 0, start
+        return start + self.below(stop - start)
+
+    def choice(self, sequence):
+        return sequence[self.below(len(sequence))]
+
+
+def fixed(value):
+    return int(round(value * one))
+
+
+# Ball.min_speed and Paddle.min_speed, per step
+ball_speed = fixed(4 / 100 * constant_delta)
+paddle_speed = fixed(6 / 100 * constant_delta)
+collision_parts = tuple((fixed(offset), fixed(height), angle) for offset, height, angle in Paddle.collision_parts)
+directions = (None, Direction.Left, Direction.Right)
+
+
+class Body(object):
+    """A sprite in fixed point: the physics side of Sprite."""
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'speed_x', 'speed_y', 'width', 'height', 'speed_changes')
+
+    def __init__(self, sprite):
+        self.x, self.y = fixed(sprite.x), fixed(sprite.y)
+        self.prev_x, self.prev_y = self.x, self.y
+        self.speed_x = self.speed_y = 0
+        self.width, self.height = fixed(sprite.width), fixed(sprite.height)
+        self.speed_changes = 0
+
+    def advance(self, time):
+        self.x += self.speed_x * time // step_time
+        self.y += self.speed_y * time // step_time
+
+    def update(self, time):
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.advance(time)
+
+    def bounce(self, angle):
+        """Sprite.bounce with the integer reflections, rounded to the nearest unit."""
+        cos, sin = reflections[angle]
+        half = 1 << (trig_bits - 1)
+        speed_x = self.speed_x
+        self.speed_x = (speed_x * cos + self.speed_y * sin + half) >> trig_bits
+        self.speed_y = (speed_x * sin - self.speed_y * cos + half) >> trig_bits
+        self.speed_changes += 1
+
+    def state(self):
+        return self.x, self.y, self.prev_x, self.prev_y, self.speed_x, self.speed_y
+
+    def set_state(self, values):
+        self.x, self.y, self.prev_x, self.prev_y, self.speed_x, self.speed_y = values
+
+
+class PaddleBody(Body):
+    __slots__ = ('min_y', 'max_y')
+
+    def __init__(self, paddle):
+        super().__init__(paddle)
+        self.min_y, self.max_y = fixed(paddle.min_y), fixed(paddle.max_y)
+
+    def move(self, input_direction):
+        self.speed_x = 0
+        if input_direction == Direction.Up:
+            self.speed_y = -paddle_speed
+        elif input_direction == Direction.Down:
+            self.speed_y = paddle_speed
+        else:
+            self.speed_y = 0
+
+    def update(self, time):
+        # restrict paddle movement
+        last_y = self.y
+        super().update(time)
+        if self.y < self.min_y or self.y > self.max_y:
+            self.y = last_y
+
+    def reflection_angle(self, offset, height):
+        for part_offset, part_height, angle in collision_parts:
+            if offset < part_offset + part_height and part_offset < offset + height:
+                return angle
+        # rounding can leave the ball a unit past the paddle's end
+        return collision_parts[0][2] if offset < 0 else collision_parts[1][2]
+
+
+class BallBody(Body):
+    __slots__ = ('rng', 'start_x', 'min_speed', 'min_speed_x')
+
+    def __init__(self, ball, rng):
+        super().__init__(ball)
+        self.rng = rng
+        self.min_speed = ball_speed
+        self.min_speed_x = fixed(ball.min_speed_x * constant_delta)
+        self.start_x = fixed(center(field_size.width / 2, ball.width))
+
+    def kick_off(self, direction):
+        """Ball.kick_off in integers."""
+        rng = self.rng
+        self.x = self.start_x
+        self.y = fixed(0.05 * field_size.height) + rng.randrange(fixed(0.9 * field_size.height))
+        if direction is None:
+            direction = rng.choice([Direction.Left, Direction.Right])
+        self.speed_x = -ball_speed if direction == Direction.Left else ball_speed
+        self.speed_y = rng.randrange(-ball_speed, ball_speed + 1)
+        self.speed_changes += 1
+
+    def start_win_screen(self):
+        rng = self.rng
+        self.x = fixed(0.05 * field_size.width) + rng.randrange(fixed(0.9 * field_size.width))
+        self.y = fixed(0.05 * field_size.height) + rng.randrange(fixed(0.9 * field_size.height))
+        self.speed_x = rng.choice([1, -1]) * ball_speed
+        self.speed_y = rng.choice([1, -1]) * ball_speed
+        self.speed_changes += 1
+
+
+def time_of_impact(body, x, y, width, height, speed_x, speed_y, max_time):
+    """simulation.time_of_impact in units."""
+    relative = body.speed_x - speed_x
+    offset = body.x - x
+    if relative == 0:
+        if not -body.width < offset < width:
+            return None
+        x_enter, x_exit = -never, never
+    else:
+        x_enter = (-body.width - offset) * step_time // relative
+        x_exit = (width - offset) * step_time // relative
+        if x_enter > x_exit:
+            x_enter, x_exit = x_exit, x_enter
+        if x_exit <= 0 or x_enter > max_time:
+            return None
+    relative = body.speed_y - speed_y
+    offset = body.y - y
+    if relative == 0:
+        if not -body.height < offset < height:
+            return None
+        y_enter, y_exit = -never, never
+    else:
+        y_enter = (-body.height - offset) * step_time // relative
+        y_exit = (height - offset) * step_time // relative
+        if y_enter > y_exit:
+            y_enter, y_exit = y_exit, y_enter
+    enter = max(x_enter, y_enter)
+    exit = min(x_exit, y_exit)
+    if enter >= exit or exit <= 0 or enter > max_time:
+        return None
+    return max(enter, 0), 'x' if x_enter >= y_enter else 'y'
+
+
+def time_to_limit(position, speed, limit):
+    return max(0, (limit - position) * step_time // speed)
+
+
+class FixedMatch(Match):
+    """A Match in fixed point: Match's rules with integer bodies, numbers and arithmetic."""
+    rng_class = SplitMix64
+    top_limit, bottom_limit, left_limit, right_limit = (fixed(limit) for limit in (top_limit, bottom_limit,
+                                                                                    left_limit, right_limit))
+    forever = never
+    hidden = Position(fixed(hidden.x), fixed(hidden.y))
+    left_start = Position(*map(fixed, Match.left_start))
+    right_start = Position(*map(fixed, Match.right_start))
+    first_kick_off_delay = round(Match.first_kick_off_delay / constant_delta) * step_time
+    goal_kick_off_delay = round(Match.goal_kick_off_delay / constant_delta) * step_time
+    speed_unit = one * constant_delta
+    step_duration = step_time
+    time_of_impact = staticmethod(time_of_impact)
+    time_to_limit = staticmethod(time_to_limit)
+    root = staticmethod(math.isqrt)
+
+    def __init__(self, seed=None, on_event=None):
+        super().__init__(seed, on_event)
+        self.publish()
+
+    def bodies(self):
+        return PaddleBody(self.left_paddle), PaddleBody(self.right_paddle), BallBody(self.ball, self.rng)
+
+    def publish(self):
+        """Copy the bodies to the sprites, in field units and milliseconds."""
+        for sprite, body in ((self.ball, self.ball_body), (self.left_paddle, self.left_body),
+                             (self.right_paddle, self.right_body)):
+            sprite.x, sprite.y = body.x / one, body.y / one
+            sprite.prev_x, sprite.prev_y = body.prev_x / one, body.prev_y / one
+            sprite.speed_x, sprite.speed_y = body.speed_x / self.speed_unit, body.speed_y / self.speed_unit
+        self.ball.speed_changes = self.ball_body.speed_changes
+
+    @staticmethod
+    def distance(speed, time):
+        return speed * time // step_time
+
+    @staticmethod
+    def velocity(distance, time):
+        return distance * step_time // time
+
+    def state(self):
+        """All of the state but the virtual time and the random generator's (an unsigned 64 bit integer), as an array
+        of integers."""
+        return array('q', (self.score[0], self.score[1], self.step_count, self.showing_winner_screen,
+                           self.delaying_kick_off, directions.index(self.kick_off_direction),
+                           -1 if self.kick_off_timer is None else self.kick_off_timer, self.ball_body.speed_changes) +
+                     self.ball_body.state() + self.left_body.state() + self.right_body.state())
+
+    def set_state(self, state):
+        (left_score, right_score, self.step_count, showing_winner_screen, delaying_kick_off, direction, timer,
+         self.ball_body.speed_changes) = state[:8]
+        self.score = (left_score, right_score)
+        self.showing_winner_screen, self.delaying_kick_off = bool(showing_winner_screen), bool(delaying_kick_off)
+        self.kick_off_direction = directions[direction]
+        self.kick_off_timer = None if timer == -1 else timer
+        self.ball_body.set_state(state[8:14])
+        self.left_body.set_state(state[14:20])
+        self.right_body.set_state(state[20:26])
+
+    def state_hash(self):
+        """A digest of the state that is the same on every platform."""
+        state = self.state()
+        return hashlib.blake2b(struct.pack('<Q{}q'.format(len(state)), self.rng.state, *state),
+                               digest_size=16).hexdigest()
+
+    def snapshot(self):
+        return self.rng.state, self.virtual_time, self.state()
+
+    def restore(self, snapshot):
+        self.rng.state, self.virtual_time, state = snapshot
+        self.set_state(state)
+        self.publish()
+
+    def reset(self):
+        super().reset()
+        self.publish()
+
+    def step(self, left_direction, right_direction):
+        super().step(left_direction, right_direction)
+        self.publish()
+
+    def fast_forward(self, duration, left_direction=None, right_direction=None):
+        """The steps of duration milliseconds one by one: jumping from event to event would take fractions of steps."""
+        for _ in range(int(round(duration / self.delta))):
+            self.step(left_direction, right_direction)
@@ -0,0 +1,290 @@
+"""Physics fuzzer: plays a grid of kick off parameters against a grid of paddle positions and movements all at once with
+NumPy, following the same rules as Match.step, and reports the configurations that show the known physics bugs:
+    wall slide: the ball bounces off a wall on consecutive steps (the hit sound repeats all the way)
+    tunnel: the ball goes through a paddle or a wall without colliding
+    oscillation: the ball bounces off a paddle on consecutive steps (back and forth around the paddle)
+    stall: the ball slows down below Ball.min_speed_x across the field (stuck against a paddle)
+It then replays the fast forwards that once got stuck, see fast_forward_regressions.
+
+Usage: python fuzz.py [steps]"""
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+import controllers
+from simulation import (Ball, Direction, Match, Paddle, Position, Vector, bottom_limit, center, constant_delta, field_size,
+                        left_limit, max_bounces, right_limit, top_limit)
+
+Config = namedtuple('Config', 'kick_off_y vertical direction left_paddle_y right_paddle_y paddle_direction')
+
+# (seed, left controller, right controller) of Match.run_fast games that once hung or lost the ball: seed 4 squeezed
+# the ball between the bottom wall and a rising paddle end 70 seconds in, with impacts femtoseconds apart
+fast_forward_cases = [(4, 'impossible', 'loose')]
+
+wall_slide, tunnel, oscillation, stall = 1, 2, 4, 8
+bug_names = {wall_slide: 'wall slide', tunnel: 'tunnel', oscillation: 'oscillation', stall: 'stall'}
+
+
+def configurations(kick_off_ys, verticals, directions, left_paddle_ys, right_paddle_ys, paddle_directions=(0,)):
+    """Every combination of the parameters as flat arrays. kick_off_ys and verticals are the two random() values that
+    Ball.kick_off uses for the y position and the vertical speed. A paddle direction of 1 moves both paddles towards the
+    ball's height every step, -1 away from it and 0 leaves them still."""
+    grid = np.meshgrid(kick_off_ys, verticals, directions, left_paddle_ys, right_paddle_ys, paddle_directions,
+                       indexing='ij')
+    return Config(*(np.ravel(a) for a in grid))
+
+
+def default_configurations(resolution=20):
+    randoms = np.linspace(0, 1, resolution, endpoint=False) + 0.5 / resolution
+    paddle = Paddle(0)
+    paddle_ys = np.linspace(paddle.min_y, paddle.max_y, resolution // 2)
+    return configurations(randoms, randoms, [Direction.Left, Direction.Right], paddle_ys, paddle_ys, [-1, 0, 1])
+
+
+def reflect(mask, vx, vy, angle):
+    """Vectorized reflect, for the ones in mask, off a surface sloped angle (a scalar or an array)."""
+    double = np.radians(2 * (angle if np.isscalar(angle) else angle[mask]))
+    cos, sin = np.cos(double), np.sin(double)
+    vx_mask, vy_mask = vx[mask], vy[mask]
+    vx[mask] = vx_mask * cos + vy_mask * sin
+    vy[mask] = vx_mask * sin - vy_mask * cos
+
+
+def sweep_axis(offset, speed, low, high):
+    """The times a point moving at speed, offset from a box, enters and leaves the box's span of low to high on one
+    axis, vectorized: one half of simulation.time_of_impact."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1, t2 = (low - offset) / speed, (high - offset) / speed
+    inside = (low < offset) & (offset < high)
+    still = speed == 0
+    enter = np.where(still, np.where(inside, -np.inf, np.inf), np.minimum(t1, t2))
+    exit = np.where(still, np.where(inside, np.inf, -np.inf), np.maximum(t1, t2))
+    return enter, exit
+
+
+def paddle_impact(x, y, vx, vy, paddle_x, paddle_y, paddle_vy, size):
+    """Vectorized simulation.time_of_impact against a paddle moving vertically at paddle_vy: the time of impact (inf if
+    there's none) and whether the paddle's top or bottom end was hit."""
+    x_enter, x_exit = sweep_axis(x - paddle_x, vx, -1, size.width)
+    y_enter, y_exit = sweep_axis(y - paddle_y, vy - paddle_vy, -1, size.height)
+    enter, exit = np.maximum(x_enter, y_enter), np.minimum(x_exit, y_exit)
+    hit = (enter < exit) & (exit > 1e-9)
+    return np.where(hit, np.maximum(enter, 0), np.inf), y_enter > x_enter
+
+
+def leave_paddle(hit, end, away, vx, vy, speed, y, paddle_y, paddle_vy):
+    """Vectorized Match.leave_paddle for the ones in hit, which just bounced off a paddle at speed (before the bounce)
+    and should leave it towards away (1 for the left paddle, -1 for the right one). end tells the hits on the paddle's
+    top or bottom end, at paddle_y moving at paddle_vy."""
+    ball = Ball()
+    speed = np.maximum(speed, ball.min_speed)
+    min_speed_x = ball.min_speed_x
+    face = hit & ~end & (vx * away < min_speed_x)
+    face_vy = np.sqrt(np.maximum(0, speed[face] ** 2 - min_speed_x ** 2))
+    vx[face] = away * min_speed_x
+    vy[face] = np.where(vy[face] >= 0, face_vy, -face_vy)
+    clamped = np.where(y < paddle_y, np.minimum(vy, paddle_vy - min_speed_x), np.maximum(vy, paddle_vy + min_speed_x))
+    end = hit & end & ((clamped != vy) | (np.abs(vx) < min_speed_x))
+    vy[end] = clamped[end]
+    end_vx = np.maximum(min_speed_x, np.sqrt(np.maximum(0, speed[end] ** 2 - vy[end] ** 2)))
+    vx[end] = np.where((vx[end] < 0) | ((vx[end] == 0) & (away < 0)), -end_vx, end_vx)
+
+
+def time_to_limit(position, speed, limit, towards):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(towards, np.maximum(0, (limit - position) / speed), np.inf)
+
+
+def reflection_angles(y, paddle_y):
+    angles = np.full(y.shape, np.nan)
+    for offset, height, angle in Paddle.collision_parts:
+        part_y = paddle_y + offset
+        hit = np.isnan(angles) & (y < part_y + height) & (part_y < y + 1)
+        angles[hit] = angle
+    return angles
+
+
+def crossed(prev_x, x, prev_y, y, paddle_x, prev_paddle_y, paddle_y, size):
+    """The ball went from one side of the paddle to the other within a step while being at a height the paddle went
+    through."""
+    low, high = paddle_x - 1, paddle_x + size.width
+    jumped = ((prev_x <= low) & (x >= high)) | ((prev_x >= high) & (x <= low))
+    top, bottom = np.minimum(prev_paddle_y, paddle_y) - 1, np.maximum(prev_paddle_y, paddle_y) + size.height
+    return jumped & (np.maximum(prev_y, y) > top) & (np.minimum(prev_y, y) < bottom)
+
+
+def sweep(config, steps=600, delta=constant_delta):
+    """Play every configuration for up to steps physics steps or until a goal. Returns the bug flags of each
+    configuration and the step where each first showed up (-1 if it didn't)."""
+    ball = Ball()
+    left, right = Paddle(10), Paddle(170)
+    n = len(config.kick_off_y)
+    x = np.full(n, center(field_size.width / 2, ball.size.width))
+    y = (config.kick_off_y * 0.9 + 0.05) * field_size.height
+    vx = np.where(config.direction == Direction.Left, -ball.min_speed, ball.min_speed)
+    vy = (1 - 2 * config.vertical) * ball.min_speed
+    left_y, right_y = config.left_paddle_y.astype(float), config.right_paddle_y.astype(float)
+    alive = np.ones(n, dtype=bool)
+    flags = np.zeros(n, dtype=np.int8)
+    first_step = np.full(n, -1)
+    last_wall = np.full(n, -2)
+    last_paddle = np.full(n, -2)
+
+    def flag(mask, bug, step):
+        first_step[mask & (flags == 0)] = step
+        flags[mask] |= bug
+
+    def move_paddle(paddle, paddle_y):
+        """Paddle.move and Paddle.update: the paddle's new y and the speed it got there at."""
+        towards = np.sign(center(y, ball.size.height) - center(paddle_y, paddle.size.height))
+        moved = paddle_y + config.paddle_direction * towards * paddle.min_speed * delta
+        moved = np.where((moved < paddle.min_y) | (moved > paddle.max_y), paddle_y, moved)
+        return moved, (moved - paddle_y) / delta
+
+    def next_impact():
+        """The first impact of each: which surface (top wall, bottom wall, left or right paddle), when, and whether it
+        was on the end of the paddle."""
+        left_time, left_end = paddle_impact(x, y, vx, vy, left.position.x, left_y, left_vy, left.size)
+        right_time, right_end = paddle_impact(x, y, vx, vy, right.position.x, right_y, right_vy, right.size)
+        times = np.stack([time_to_limit(y, vy, top_limit, vy < 0),
+                          time_to_limit(y + 1, vy, bottom_limit, vy > 0),
+                          left_time, right_time])
+        first = np.argmin(times, axis=0)
+        return first, times[first, np.arange(n)], left_end, right_end
+
+    for step in range(steps):
+        prev_x, prev_y = x.copy(), y.copy()
+        # the controls see the ball where it was, then the paddles move and the ball is swept against them
+        prev_left_y, prev_right_y = left_y, right_y
+        new_left_y, left_vy = move_paddle(left, left_y)
+        new_right_y, right_vy = move_paddle(right, right_y)
+        remaining = np.where(alive, delta, 0.0)
+        walls = np.zeros(n, dtype=bool)
+        paddles = np.zeros(n, dtype=bool)
+        bounces = np.zeros(n, dtype=int)
+        for _ in range(max_bounces):
+            first, time, left_end, right_end = next_impact()
+            hit = alive & (time <= remaining)
+            if not hit.any():
+                break
+            speed = np.sqrt(vx * vx + vy * vy)
+            x[hit] += vx[hit] * time[hit]
+            y[hit] += vy[hit] * time[hit]
+            left_y = np.where(hit, left_y + left_vy * time, left_y)
+            right_y = np.where(hit, right_y + right_vy * time, right_y)
+            remaining[hit] -= time[hit]
+            bounces[hit] += 1
+            wall = hit & (first <= 1)
+            reflect(wall, vx, vy, 0)
+            walls |= wall
+            left_hit = hit & (first == 2)
+            reflect(left_hit & left_end, vx, vy, 0)
+            reflect(left_hit & ~left_end, vx, vy, 90)
+            leave_paddle(left_hit, left_end, 1, vx, vy, speed, y, left_y, left_vy)
+            right_hit = hit & (first == 3)
+            reflect(right_hit & right_end, vx, vy, 0)
+            right_face = right_hit & ~right_end
+            reflect(right_face, vx, vy, reflection_angles(y, right_y))
+            leave_paddle(right_hit, right_end, -1, vx, vy, speed, y, right_y, right_vy)
+            paddles |= left_hit | right_hit
+        # out of bounces, the ball stops short of its next impact
+        out = bounces == max_bounces
+        if out.any():
+            time = next_impact()[1]
+            remaining[out] = np.minimum(remaining[out], time[out])
+        x += vx * remaining
+        y += vy * remaining
+        flag(alive & ((y < top_limit) | (y + 1 > bottom_limit)), tunnel, step)
+        np.clip(y, top_limit, bottom_limit - 1, out=y)
+        left_y, right_y = new_left_y, new_right_y
+        for paddle, prev_paddle_y, paddle_y in (left, prev_left_y, left_y), (right, prev_right_y, right_y):
+            flag(alive & ~paddles & crossed(prev_x, x, prev_y, y, paddle.position.x, prev_paddle_y, paddle_y,
+                                            paddle.size), tunnel, step)
+        # a ball going through the gap between a wall and the end of a paddle bounces off both one step after the other,
+        # that's neither sliding along the wall nor going back and forth around the paddle
+        pinched = (walls | (last_wall == step - 1)) & (paddles | (last_paddle == step - 1))
+        flag(walls & (last_wall == step - 1) & ~pinched, wall_slide, step)
+        last_wall[walls] = step
+        flag(paddles & (last_paddle == step - 1) & ~pinched, oscillation, step)
+        last_paddle[paddles] = step
+        flag(alive & (np.abs(vx) < ball.min_speed_x), stall, step)
+        alive &= (x > left_limit) & (x + 1 < right_limit)
+        if not alive.any():
+            break
+    return flags, first_step
+
+
+def configure_match(config, index):
+    """A Match right after the kick off of configuration index, to reproduce it step by step with the scalar physics:
+    match.run(steps, control, control) with control = paddle_control(config, index)."""
+    ball = Ball()
+    match = Match()
+    match.ball.position = Position(center(field_size.width / 2, ball.size.width),
+                                   (config.kick_off_y[index] * 0.9 + 0.05) * field_size.height)
+    match.ball.prev_position = match.ball.position
+    direction = -1 if config.direction[index] == Direction.Left else 1
+    match.ball.speed = Vector(direction * ball.min_speed, (1 - 2 * config.vertical[index]) * ball.min_speed)
+    for paddle, paddle_y in ((match.left_paddle, config.left_paddle_y[index]),
+                             (match.right_paddle, config.right_paddle_y[index])):
+        paddle.position = Position(paddle.position.x, float(paddle_y))
+        paddle.prev_position = paddle.position
+    return match
+
+
+def paddle_control(config, index):
+    """The control that moves either paddle of configuration index the way sweep does."""
+    paddle_direction = config.paddle_direction[index]
+
+    def control(paddle, ball):
+        direction = controllers.towards(paddle, center(ball.y, ball.height), 0)
+        if paddle_direction == 0 or direction is None:
+            return None
+        if paddle_direction > 0:
+            return direction
+        return Direction.Up if direction == Direction.Down else Direction.Down
+    return control
+
+
+def fast_forward_regressions(cases=fast_forward_cases, minutes=5):
+    """Play each case with Match.run_fast's polling for minutes of virtual time. Returns a line for each case that ended
+    with the ball outside the walls. A hang doesn't return at all."""
+    failures = []
+    for seed, left_name, right_name in cases:
+        match = Match(seed=seed)
+        left_control, right_control = controllers.make(left_name), controllers.make(right_name)
+        for _ in range(int(minutes * 60000 / constant_delta)):
+            match.fast_forward(constant_delta, left_control(match.left_paddle, match.ball),
+                               right_control(match.right_paddle, match.ball))
+            ball = match.ball
+            if ball.y < top_limit or ball.y + ball.size.height > bottom_limit:
+                failures.append('seed {} {} vs {}: ball at y {} at {:.1f} ms'.format(
+                    seed, left_name, right_name, ball.y, match.virtual_time))
+                break
+    return failures
+
+
+def report(config, flags, first_step, examples=5):
+    lines = ['{} configurations'.format(len(flags))]
+    for bug, name in sorted(bug_names.items()):
+        found = np.flatnonzero(flags & bug)
+        lines.append('{}: {} ({:.1%})'.format(name, len(found), len(found) / len(flags)))
+        for index in found[:examples]:
+            lines.append('    #{} step {} {}'.format(
+                index, first_step[index], Config(*(float(a[index]) for a in config))))
+    return '\n'.join(lines)
+
+
+def main(argv):
+    steps = int(argv[1]) if len(argv) > 1 else 600
+    config = default_configurations()
+    flags, first_step = sweep(config, steps)
+    print(report(config, flags, first_step))
+    failures = fast_forward_regressions()
+    print('fast forward regressions: {}'.format(len(failures)))
+    for failure in failures:
+        print('    ' + failure)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,97 @@
+"""Input to display latency tracing: follows every change of a player's paddle input from the key event to the first
+frame on screen that shows the paddle where the new input put it, and splits the time it took into:
+    queueing      the event waiting in the queue until the main loop polled it
+    accumulator   waiting for the physics step that moves the paddle with the new input (Paddle.move)
+    interpolation waiting for a frame that draws the state after that step, interpolated frames lag up to a step
+    presentation  display.update showing the frame
+
+pygame doesn't give events a timestamp, so an event is taken to have arrived halfway between the poll that got it and
+the one before: the queueing time is an estimate, right on average for inputs that come at random."""
+import time
+
+from profiler import percentile
+
+stages = ('queueing', 'accumulator', 'interpolation', 'presentation')
+
+
+class Trace(object):
+    """The timestamps (perf_counter_ns) of one input change on its way to the screen and the virtual time of the
+    state that has to be drawn to show it."""
+    __slots__ = ('side', 'direction', 'arrived', 'handled', 'step_time', 'applied', 'presenting', 'shown')
+
+    def __init__(self, side, direction, arrived, handled, step_time):
+        self.side = side
+        self.direction = direction
+        self.arrived = arrived
+        self.handled = handled
+        self.step_time = step_time
+        self.applied = None
+        self.presenting = None
+        self.shown = None
+
+    def stages(self):
+        """Milliseconds spent in each of the stages."""
+        return (self.handled - self.arrived) / 1e6, (self.applied - self.handled) / 1e6, \
+            (self.presenting - self.applied) / 1e6, (self.shown - self.presenting) / 1e6
+
+
+class LatencyTracer(object):
+    """Call poll() right after getting the events, input(side, direction, match) for each input change found in them,
+    stepped(match) after the physics and presenting(drawn_time) and presented() around display.update. drawn_time is
+    the virtual time of the state that was drawn: with interpolation, the step before the last one plus alpha."""
+
+    def __init__(self):
+        self.last_poll = None
+        self.poll_time = None
+        self.pending = []
+        self.traces = []
+
+    def poll(self):
+        self.last_poll, self.poll_time = self.poll_time, time.perf_counter_ns()
+
+    def input(self, side, direction, match):
+        arrived = self.poll_time if self.last_poll is None else (self.last_poll + self.poll_time) // 2
+        # the next step is the first one to move the paddle with it
+        self.pending.append(Trace(side, direction, arrived, self.poll_time, match.virtual_time + match.delta))
+
+    def cancel(self):
+        """Forget the inputs on their way, for when the match starts over and its virtual time with it."""
+        self.pending = []
+
+    def stepped(self, match):
+        now = None
+        for trace in self.pending:
+            if trace.applied is None and match.virtual_time >= trace.step_time:
+                trace.applied = now = now or time.perf_counter_ns()
+
+    def presenting(self, drawn_time):
+        now = None
+        for trace in self.pending:
+            if trace.applied is not None and trace.presenting is None and drawn_time >= trace.step_time:
+                trace.presenting = now = now or time.perf_counter_ns()
+
+    def presented(self):
+        now = time.perf_counter_ns()
+        waiting = []
+        for trace in self.pending:
+            if trace.presenting is not None:
+                trace.shown = now
+                self.traces.append(trace)
+            else:
+                waiting.append(trace)
+        self.pending = waiting
+
+    def report(self):
+        """The distribution of the latency of the inputs traced, in total and by stage."""
+        if not self.traces:
+            return 'no inputs traced'
+        by_stage = list(zip(*(trace.stages() for trace in self.traces)))
+        totals = [(trace.shown - trace.arrived) / 1e6 for trace in self.traces]
+        lines = ['input latency of {} inputs, ms:'.format(len(self.traces)),
+                 '{:14} {:>7} {:>7} {:>7} {:>7} {:>7}'.format('', 'mean', 'p50', 'p95', 'p99', 'max')]
+        for name, values in list(zip(stages, by_stage)) + [('total', totals)]:
+            ordered = sorted(values)
+            lines.append('{:14} {:7.2f} {:7.2f} {:7.2f} {:7.2f} {:7.2f}'.format(
+                name, sum(ordered) / len(ordered), percentile(ordered, 0.5), percentile(ordered, 0.95),
+                percentile(ordered, 0.99), ordered[-1]))
+        return '\n'.join(lines)
@@ -0,0 +1,119 @@
+"""Multi-ball party mode: a match with any number of extra balls. They follow the same physics as the first one, bounce
+off each other and score, and a ball that scores is kicked off again right away.
+
+Finding the balls that touch each other by checking every pair would be O(n^2), so they are first sorted into a
+uniform grid over the field, a spatial hash: a ball can only touch the balls in its own cell and the ones around it."""
+from simulation import Ball, Direction, Match, left_limit, right_limit, winning_score
+
+
+class SpatialHash(object):
+    """A uniform grid of cell_size cells, for sprites no bigger than cell_size."""
+
+    def __init__(self, cell_size=2):
+        self.cell_size = cell_size
+        # half of the neighbours, so every pair of neighbouring cells is visited once
+        self.neighbours = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+    def cells(self, sprites):
+        cell_size = self.cell_size
+        cells = {}
+        for sprite in sprites:
+            key = (int(sprite.x // cell_size), int(sprite.y // cell_size))
+            if key in cells:
+                cells[key].append(sprite)
+            else:
+                cells[key] = [sprite]
+        return cells
+
+    def pairs(self, sprites):
+        """Every pair of sprites that are in the same or neighbouring cells, once: the only ones that may overlap."""
+        cells = self.cells(sprites)
+        for (cell_x, cell_y), members in cells.items():
+            for index, sprite in enumerate(members):
+                for other in members[index + 1:]:
+                    yield sprite, other
+            for offset_x, offset_y in self.neighbours:
+                neighbours = cells.get((cell_x + offset_x, cell_y + offset_y))
+                if neighbours:
+                    for sprite in members:
+                        for other in neighbours:
+                            yield sprite, other
+
+
+def collide(a, b):
+    """If the two balls overlap, separate them along the axis they overlap the least on and, if they are coming
+    together along it, swap their speeds on it: an elastic collision of equal masses. Returns True if they touched."""
+    # most candidates don't touch, rule them out first
+    dx, dy = b.x - a.x, b.y - a.y
+    if not (-b.width < dx < a.width and -b.height < dy < a.height):
+        return False
+    overlap_x = a.width - dx if dx >= 0 else b.width + dx
+    overlap_y = a.height - dy if dy >= 0 else b.height + dy
+    if overlap_x < overlap_y:
+        shift = overlap_x / 2 if dx >= 0 else -overlap_x / 2
+        a.x -= shift
+        b.x += shift
+        if dx * (a.speed_x - b.speed_x) > 0:
+            a.speed_x, b.speed_x = b.speed_x, a.speed_x
+            a.speed_changes += 1
+            b.speed_changes += 1
+    else:
+        shift = overlap_y / 2 if dy >= 0 else -overlap_y / 2
+        a.y -= shift
+        b.y += shift
+        if dy * (a.speed_y - b.speed_y) > 0:
+            a.speed_y, b.speed_y = b.speed_y, a.speed_y
+            a.speed_changes += 1
+            b.speed_changes += 1
+    return True
+
+
+class MultiBallMatch(Match):
+    """A Match with extra_balls more balls, kicked off from the start. Only the first ball's events are sent to
+    on_event and event_log, hundreds of balls hitting things would be just noise."""
+
+    def __init__(self, extra_balls, seed=None, on_event=None, cell_size=2):
+        super().__init__(seed, on_event)
+        self.extra_balls = []
+        for _ in range(extra_balls):
+            ball = Ball(self.rng)
+            ball.kick_off(None)
+            self.extra_balls.append(ball)
+        self.grid = SpatialHash(cell_size)
+        self.ball_collisions = 0
+
+    def step(self, left_direction, right_direction):
+        super().step(left_direction, right_direction)
+        first_ball, on_event, event_log = self.ball, self.on_event, self.event_log
+        self.on_event = self.event_log = None
+        # move_ball works on the ball's body, with the paddles' sweep of this step
+        for ball in self.extra_balls:
+            self.ball = self.ball_body = ball
+            self.move_ball()
+            self.check_extra_goal(ball)
+        self.ball = self.ball_body = first_ball
+        self.on_event, self.event_log = on_event, event_log
+        self.collide_balls()
+
+    def check_extra_goal(self, ball):
+        # goals past the winning score would skip check_winner
+        if not self.showing_winner_screen and winning_score not in self.score:
+            if ball.x <= left_limit:
+                self.score = (self.score[0], self.score[1] + 1)
+                ball.kick_off(Direction.Left)
+            elif ball.x + ball.width >= right_limit:
+                self.score = (self.score[0] + 1, self.score[1])
+                ball.kick_off(Direction.Right)
+
+    def collide_balls(self):
+        for a, b in self.grid.pairs([self.ball] + self.extra_balls):
+            if collide(a, b):
+                self.ball_collisions += 1
+
+    def snapshot(self):
+        return super().snapshot() + (tuple(ball.snapshot() for ball in self.extra_balls),)
+
+    def restore(self, snapshot):
+        super().restore(snapshot[:-1])
+        for ball, ball_snapshot in zip(self.extra_balls, snapshot[-1]):
+            ball.restore(ball_snapshot)
@@ -0,0 +1,324 @@
+"""Network play with rollback. Each of the two peers runs the same seeded Match and controls one paddle: the host the
+left one, the peer that joins the right one. Over a TCP connection (asyncio streams) they only send their input
+changes and, a few times a second, the step they are at.
+
+Nobody waits for the other's inputs: a remote paddle is predicted to keep doing what it was last known to do. When a
+change arrives for a step that was already simulated, the match is restored to the snapshot taken before that step and
+the steps since are simulated again with the right input. Both peers end up with exactly the same match, however late
+the inputs arrive, as long as it's within the snapshots kept; to make sure of that a peer that gets too far ahead of
+the other stops and waits.
+
+To try it over localhost, with latency and jitter (one way, in milliseconds) added to everything sent:
+    python pong.py --host 5555 --latency 60 --jitter 20
+    python pong.py --join localhost:5555 --latency 60 --jitter 20
+or headless, two AI peers in one process that check they ended up in the same state:
+    python netplay.py --selftest [--seconds 10] [--latency 60] [--jitter 20] [--fixed-point]"""
+import argparse
+import asyncio
+import queue
+import random
+import struct
+import sys
+import threading
+from collections import deque
+
+import controllers
+import recording
+from fixedpoint import FixedMatch
+from simulation import Match
+
+# magic, seed and whether the physics is fixed point, sent by the host
+hello = struct.Struct('<7sQB')
+magic = b'PONGNET'
+message = struct.Struct('<BIB')
+input_message, sync_message = range(2)
+sync_interval = 6
+
+
+class Session(object):
+    """The rollback bookkeeping of one peer, without any networking: feed it the remote's messages with
+    remote_input and remote_sync, call rollback to fix the match with them and advance for every local step.
+
+    max_rollback is how many steps of snapshots are kept and max_ahead how many steps this peer may go beyond the last
+    step it knows the remote got to."""
+
+    def __init__(self, match, side, max_rollback=48, max_ahead=36):
+        self.match = match
+        self.side = side
+        self.max_ahead = max_ahead
+        # (step, snapshot before it, local input) of the latest steps
+        self.history = deque(maxlen=max_rollback)
+        # (step, direction) of the remote's input changes, in order
+        self.remote_changes = [(0, None)]
+        self.remote_step = 0
+        self.local_direction = None
+        self.rollback_step = None
+        self.rollbacks = 0
+        self.max_rollback_steps = 0
+
+    def remote_direction(self, step):
+        """The remote's input on step, as far as we know: its last change up to then."""
+        for change_step, direction in reversed(self.remote_changes):
+            if change_step <= step:
+                return direction
+        return self.remote_changes[0][1]
+
+    def remote_input(self, step, direction):
+        predicted = self.remote_direction(step)
+        self.remote_changes.append((step, direction))
+        self.remote_step = max(self.remote_step, step)
+        if step < self.match.step_count and direction != predicted:
+            if self.rollback_step is None or step < self.rollback_step:
+                self.rollback_step = step
+
+    def remote_sync(self, step):
+        self.remote_step = max(self.remote_step, step)
+
+    def can_advance(self):
+        return self.match.step_count - self.remote_step < self.max_ahead
+
+    def simulate(self, local_direction):
+        match = self.match
+        step = match.step_count
+        self.history.append((step, match.snapshot(), local_direction))
+        remote_direction = self.remote_direction(step)
+        if self.side == 'left':
+            match.step(local_direction, remote_direction)
+        else:
+            match.step(remote_direction, local_direction)
+
+    def advance(self, local_direction):
+        """Take a step with the local input, returns True if it changed and has to be sent."""
+        changed = local_direction != self.local_direction
+        self.local_direction = local_direction
+        self.simulate(local_direction)
+        # changes from before the oldest snapshot are only needed for the input they left in place
+        oldest = self.history[0][0]
+        while len(self.remote_changes) > 1 and self.remote_changes[1][0] <= oldest:
+            self.remote_changes.pop(0)
+        return changed
+
+    def rollback(self):
+        """Simulate the steps again from the first one that had a mispredicted remote input, returns how many."""
+        if self.rollback_step is None:
+            return 0
+        start, self.rollback_step = self.rollback_step, None
+        index = start - self.history[0][0]
+        if index < 0:
+            raise RuntimeError('Input for step {} came too late to roll back'.format(start))
+        replayed = [self.history.pop() for _ in range(len(self.history) - index)]
+        self.match.restore(replayed[-1][1])
+        # the sounds were played and the events logged the first time
+        on_event, event_log = self.match.on_event, self.match.event_log
+        self.match.on_event = self.match.event_log = None
+        for _, _, local_direction in reversed(replayed):
+            self.simulate(local_direction)
+        self.match.on_event, self.match.event_log = on_event, event_log
+        self.rollbacks += 1
+        self.max_rollback_steps = max(self.max_rollback_steps, len(replayed))
+        return len(replayed)
+
+
+class Link(object):
+    """The sending end of the connection. send() can be called from any thread. With latency and jitter (milliseconds)
+    every message is held back about that long, but kept in order, like a slow network would."""
+
+    def __init__(self, loop, writer, latency=0, jitter=0, seed=None):
+        self.loop = loop
+        self.writer = writer
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        # (delivery time, data) of the messages held back, in order
+        self.pending = deque()
+
+    def send(self, data):
+        self.loop.call_soon_threadsafe(self.schedule, data)
+
+    def schedule(self, data):
+        if not self.latency and not self.jitter:
+            self.write(data)
+            return
+        when = self.loop.time() + max(0, self.latency + self.rng.uniform(-self.jitter, self.jitter)) / 1000
+        if self.pending:
+            when = max(when, self.pending[-1][0])
+        else:
+            self.loop.call_at(when, self.deliver)
+        self.pending.append((when, data))
+
+    def deliver(self):
+        while self.pending and self.pending[0][0] <= self.loop.time():
+            self.write(self.pending.popleft()[1])
+        if self.pending:
+            self.loop.call_at(self.pending[0][0], self.deliver)
+
+    def write(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+
+class Connection(object):
+    """A connected peer: the seed, physics and side of the match, a link to send messages and a queue of the ones
+    received."""
+
+    def __init__(self, seed, fixed_point, side, link):
+        self.seed = seed
+        self.fixed_point = fixed_point
+        self.side = side
+        self.link = link
+        self.received = queue.Queue()
+        self.closed = False
+
+    def send_input(self, step, direction):
+        self.link.send(message.pack(input_message, step, recording.direction_codes[direction]))
+
+    def send_sync(self, step):
+        self.link.send(message.pack(sync_message, step, 0))
+
+    def new_match(self, on_event=None):
+        return (FixedMatch if self.fixed_point else Match)(seed=self.seed, on_event=on_event)
+
+    def deliver(self, session):
+        """Hand the messages received so far to session."""
+        while True:
+            try:
+                kind, step, value = self.received.get_nowait()
+            except queue.Empty:
+                return
+            if kind == input_message:
+                session.remote_input(step, recording.directions[value])
+            else:
+                session.remote_sync(step)
+
+    async def receive(self, reader):
+        try:
+            while True:
+                self.received.put(message.unpack(await reader.readexactly(message.size)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed = True
+
+
+async def host(port, latency=0, jitter=0, fixed_point=False):
+    """Wait for a peer to join on port and start a match with it, in fixed point physics or not. Returns the
+    Connection."""
+    joined = asyncio.get_running_loop().create_future()
+
+    def on_join(reader, writer):
+        if not joined.done():
+            joined.set_result((reader, writer))
+        else:
+            writer.close()
+
+    server = await asyncio.start_server(on_join, port=port)
+    async with server:
+        reader, writer = await joined
+    seed = random.randrange(2 ** 64)
+    writer.write(hello.pack(magic, seed, fixed_point))
+    connection = Connection(seed, fixed_point, 'left', Link(asyncio.get_running_loop(), writer, latency, jitter))
+    asyncio.ensure_future(connection.receive(reader))
+    return connection
+
+
+async def join(address, port, latency=0, jitter=0):
+    reader, writer = await asyncio.open_connection(address, port)
+    file_magic, seed, fixed_point = hello.unpack(await reader.readexactly(hello.size))
+    if file_magic != magic:
+        writer.close()
+        raise ConnectionError('{}:{} is not a pong host'.format(address, port))
+    connection = Connection(seed, bool(fixed_point), 'right', Link(asyncio.get_running_loop(), writer, latency, jitter))
+    asyncio.ensure_future(connection.receive(reader))
+    return connection
+
+
+def connect(address, port, latency=0, jitter=0, fixed_point=False):
+    """Host (address None) or join a match, with the network running in a background thread, for a game loop that
+    isn't asyncio. Blocks until connected. fixed_point is the host's choice, a peer that joins plays what the host
+    chose."""
+    result = {}
+    connected = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            if address is None:
+                result['connection'] = loop.run_until_complete(host(port, latency, jitter, fixed_point))
+            else:
+                result['connection'] = loop.run_until_complete(join(address, port, latency, jitter))
+        except (OSError, ConnectionError) as error:
+            result['error'] = error
+        connected.set()
+        if 'connection' in result:
+            loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    connected.wait()
+    if 'error' in result:
+        raise result['error']
+    return result['connection']
+
+
+async def play_headless(connection, control, steps, delta):
+    """Play steps steps in real time, controlled by control, then wait for the remote to get there too. Returns the
+    session."""
+    match = connection.new_match()
+    session = Session(match, connection.side)
+    paddle = match.left_paddle if connection.side == 'left' else match.right_paddle
+    while match.step_count < steps or session.remote_step < steps:
+        connection.deliver(session)
+        session.rollback()
+        if match.step_count < steps and session.can_advance():
+            direction = control(paddle, match.ball)
+            if session.advance(direction):
+                connection.send_input(match.step_count - 1, direction)
+            if match.step_count % sync_interval == 0 or match.step_count == steps:
+                connection.send_sync(match.step_count)
+        if connection.closed:
+            raise ConnectionError('The other peer left')
+        await asyncio.sleep(delta / 1000)
+    connection.deliver(session)
+    session.rollback()
+    return session
+
+
+async def selftest(seconds, latency, jitter, port, fixed_point):
+    steps = int(seconds * 1000 / Match().delta)
+    hosting = asyncio.ensure_future(host(port, latency, jitter, fixed_point))
+    await asyncio.sleep(0.1)
+    joined = await join('localhost', port, latency, jitter)
+    hosted = await hosting
+    sessions = await asyncio.gather(play_headless(hosted, controllers.make('predictor_medium'), steps, Match().delta),
+                                    play_headless(joined, controllers.make('loose'), steps, Match().delta))
+    for connection in hosted, joined:
+        connection.link.close()
+    return sessions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Pong network play')
+    parser.add_argument('--selftest', action='store_true',
+                        help='play two AI peers against each other over localhost and compare their matches')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--latency', type=float, default=60, help='one way milliseconds added to every message')
+    parser.add_argument('--jitter', type=float, default=20, help='milliseconds of random variation of the latency')
+    parser.add_argument('--fixed-point', action='store_true', help='play with the fixed point physics')
+    args = parser.parse_args(argv[1:])
+    if not args.selftest:
+        parser.error('network games are played with pong.py --host or --join, see --help')
+    sessions = asyncio.run(selftest(args.seconds, args.latency, args.jitter, args.port, args.fixed_point))
+    digests = []
+    for session in sessions:
+        digests.append(recording.state_digest(session.match))
+        print('{}: step {} score {}-{} rollbacks {} (up to {} steps) state {}'.format(
+            session.side, session.match.step_count, session.match.score[0], session.match.score[1],
+            session.rollbacks, session.max_rollback_steps, digests[-1]))
+    print('same state' if digests[0] == digests[1] else 'DESYNC')
+    return 0 if digests[0] == digests[1] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,76 @@
+"""Frame pacing for the main loop: when the machine can't keep up, render less instead of pausing the game.
+
+The pacer tracks how long physics and rendering take (a moving average) and, when a frame's work doesn't fit its
+budget any more, sheds render work a level at a time: a lower frame rate, then no interpolation, which means frames
+without a physics step aren't rendered at all. When there's room again it goes back up. The physics never waits for
+the rendering: after a hitch the simulation catches up a few steps per frame on top of the frame's own, and time lost
+beyond max_backlog is dropped."""
+import time
+
+
+class FramePacer(object):
+    """rates are the frame rates to choose from, fastest first. The render levels are the rates with interpolation
+    and then the slowest rate without it. max_backlog is the most milliseconds of game time that can be owed and
+    catch_up the most steps a frame takes beyond the ones its own time is worth. spin, if set, is the seconds before a
+    frame's deadline to stop sleeping and poll the timer instead: sleep often oversleeps by a millisecond or more, but
+    polling keeps a core busy."""
+
+    def __init__(self, rates=(120, 60, 30), max_backlog=8 * 1000 / 24, catch_up=2, spin=0, smoothing=0.05):
+        self.rates = rates
+        self.max_backlog = max_backlog
+        self.catch_up = catch_up
+        self.spin = spin
+        self.smoothing = smoothing
+        self.level = 0
+        self.physics_ms = 0
+        self.render_ms = 0
+        self.frame_ms = 1000 / rates[0]
+        self.last = time.perf_counter()
+
+    @property
+    def rate(self):
+        return self.rates[min(self.level, len(self.rates) - 1)]
+
+    @property
+    def interpolate(self):
+        return self.level < len(self.rates)
+
+    def wait(self):
+        """Sleep until it's time for the next frame, returns the milliseconds since the last one. A late frame starts
+        right away, the time isn't made up with shorter frames."""
+        deadline = self.last + 1 / self.rate
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        if self.spin:
+            while time.perf_counter() < deadline:
+                pass
+        now = time.perf_counter()
+        elapsed = (now - self.last) * 1000
+        self.last = now
+        self.frame_ms += (elapsed - self.frame_ms) * self.smoothing
+        return elapsed
+
+    def fps(self):
+        return 1000 / self.frame_ms
+
+    def clamp(self, accumulator):
+        return min(accumulator, self.max_backlog)
+
+    def max_steps(self, frame_ms, delta):
+        """The most steps to take in a frame that added frame_ms of game time, the rest of the backlog waits for the
+        next frames."""
+        return int(frame_ms // delta) + 1 + self.catch_up
+
+    def record(self, physics_ms, render_ms=None):
+        """The cost of the frame's physics and, if it was rendered, of its rendering. Moves to the next render level
+        when a frame's work takes most of its budget, and back when it would take well under half of the previous
+        level's."""
+        self.physics_ms += (physics_ms - self.physics_ms) * self.smoothing
+        if render_ms is not None:
+            self.render_ms += (render_ms - self.render_ms) * self.smoothing
+        work = self.physics_ms + self.render_ms
+        if work > 0.8 * 1000 / self.rate and self.level < len(self.rates):
+            self.level += 1
+        elif self.level > 0 and work < 0.4 * 1000 / self.rates[self.level - 1]:
+            self.level -= 1
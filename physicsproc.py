@@ -0,0 +1,209 @@
+"""Physics in a process of its own: the fixed step simulation keeps its pace on another core however long the renderer
+takes, and the renderer draws whatever the latest state is.
+
+The two processes share two blocks of memory (multiprocessing.shared_memory):
+    state    written by the physics: two slots, each with everything the renderer draws (the sprites with their
+             previous positions, the score, the flags, counters of the events for the sounds) and the wall clock time
+             of the last step. The physics writes the slot that isn't the latest and then makes it the latest, the
+             renderer copies the latest one. Each slot has a sequence number that is odd while it's being written, so
+             a copy that raced with a write (the renderer was slower than two steps) is noticed and taken again.
+    controls written by the renderer: the paddles' directions, pause, the speed multiplier and counters of the resets
+             and quit requests. Each is a register with one writer, the physics reads them before every step: no locks
+             and no queue, the inputs are state anyway.
+
+The physics process is spawned rather than forked, it doesn't need pygame or anything else the game has set up."""
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+import controllers
+import eventlog
+import recording
+from fixedpoint import FixedMatch
+from simulation import Match, constant_delta
+
+sequence = struct.Struct('<q')
+# step count, virtual time, wall time of the step (perf_counter), score, showing winner screen, delaying kick off,
+# hit_wall, hit_paddle and goal counts, then the ball's and the paddles' snapshots
+state = struct.Struct('<' + 'd' * (10 + 3 * 7))
+slot_size = sequence.size + state.size
+state_size = sequence.size + 2 * slot_size
+events = ('hit_wall', 'hit_paddle', 'goal')
+# left and right direction codes, paused, speed multiplier, resets, quit
+controls = struct.Struct('<qqqdqq')
+control_fields = {name: (index * 8, struct.Struct('<d' if name == 'speed' else '<q'))
+                  for index, name in enumerate(('left', 'right', 'paused', 'speed', 'resets', 'quit'))}
+max_backlog = 8 * constant_delta
+# copies of the state to try before checking the physics is still there to finish its write
+read_tries = 1000
+
+
+def write_control(buffer, name, value):
+    offset, field = control_fields[name]
+    field.pack_into(buffer, state_size + offset, value)
+
+
+def publish(buffer, values):
+    """Write values to the slot that isn't the latest and make it the latest."""
+    latest = sequence.unpack_from(buffer, 0)[0]
+    index = 1 - latest
+    offset = sequence.size + index * slot_size
+    count = sequence.unpack_from(buffer, offset)[0]
+    sequence.pack_into(buffer, offset, count + 1)
+    state.pack_into(buffer, offset + sequence.size, *values)
+    sequence.pack_into(buffer, offset, count + 2)
+    sequence.pack_into(buffer, 0, index)
+
+
+def read_state(buffer):
+    """The values of the latest consistent slot, None if every copy raced with a write."""
+    for _ in range(read_tries):
+        offset = sequence.size + sequence.unpack_from(buffer, 0)[0] * slot_size
+        count = sequence.unpack_from(buffer, offset)[0]
+        if count % 2 == 0:
+            values = state.unpack_from(buffer, offset + sequence.size)
+            if sequence.unpack_from(buffer, offset)[0] == count:
+                return values
+    return None
+
+
+def run(name, seed, left, right, event_log_path, fixed_point):
+    """The physics process: step the match in real time until asked to quit."""
+    memory = shared_memory.SharedMemory(name=name)
+    buffer = memory.buf
+    counts = dict.fromkeys(events, 0)
+
+    def on_event(event):
+        counts[event] += 1
+
+    match = (FixedMatch if fixed_point else Match)(seed=seed, on_event=on_event)
+    event_log = None
+    if event_log_path:
+        event_log = match.event_log = eventlog.EventLog(event_log_path)
+    left_control = controllers.make(left) if left else None
+    right_control = controllers.make(right) if right else None
+    accumulator = 0
+    last = time.perf_counter()
+    resets = paused = 0
+    speed = 1
+    while True:
+        left_code, right_code, now_paused, now_speed, now_resets, stop = controls.unpack_from(buffer, state_size)
+        if stop:
+            break
+        if event_log is not None and now_paused != paused:
+            event_log.pause(match.virtual_time, now_paused)
+        if event_log is not None and now_speed != speed:
+            event_log.speed(match.virtual_time, now_speed)
+        paused, speed = now_paused, now_speed
+        if now_resets != resets:
+            resets = now_resets
+            match.reset()
+        now = time.perf_counter()
+        if not paused:
+            accumulator = min(accumulator + (now - last) * 1000 * speed, max_backlog)
+        last = now
+        steps = 0
+        while accumulator >= match.delta:
+            accumulator -= match.delta
+            left_direction = recording.directions[left_code]
+            right_direction = recording.directions[right_code]
+            if left_control is not None:
+                left_direction = left_control(match.left_paddle, match.ball)
+            if right_control is not None:
+                right_direction = right_control(match.right_paddle, match.ball)
+            match.step(left_direction, right_direction)
+            steps += 1
+        if steps:
+            # when the accumulator was empty, the renderer interpolates from there
+            stepped_at = now - accumulator / speed / 1000
+            publish(buffer, (match.step_count, match.virtual_time, stepped_at) + match.score +
+                    (match.showing_winner_screen, match.delaying_kick_off) + tuple(counts[event] for event in events) +
+                    match.ball.snapshot() + match.left_paddle.snapshot() + match.right_paddle.snapshot())
+        # wake up for the next step, or sooner to notice the controls
+        time.sleep(min(0.002, max(0, (match.delta - accumulator) / speed / 1000)) if not paused else 0.002)
+    if event_log is not None:
+        event_log.close()
+    del buffer
+    memory.close()
+
+
+class PhysicsProcess(object):
+    """The renderer's end: starts the physics process and keeps a Match in sync with it for drawing. left and right
+    are the names of the controllers that play the paddles, None for the keyboard. The match drawn is always a Match,
+    fixed_point only changes the physics. If the physics process stops, read() raises RuntimeError."""
+
+    def __init__(self, seed, left=None, right=None, event_log=None, fixed_point=False):
+        if event_log:
+            # fail here like the game does without the process, rather than in the process with nobody to tell
+            open(event_log, 'wb').close()
+        self.memory = shared_memory.SharedMemory(create=True, size=state_size + controls.size)
+        self.buffer = self.memory.buf
+        self.buffer[:] = bytes(len(self.buffer))
+        write_control(self.buffer, 'speed', 1)
+        self.match = Match(seed=seed)
+        # the first slot is the latest until the physics publishes, with the match as it starts
+        match = self.match
+        publish(self.buffer, (0, 0, time.perf_counter()) + match.score + (False, False, 0, 0, 0) +
+                match.ball.snapshot() + match.left_paddle.snapshot() + match.right_paddle.snapshot())
+        self.counts = dict.fromkeys(events, 0)
+        self.stepped_at = time.perf_counter()
+        self.speed = 1
+        self.resets = 0
+        self.process = multiprocessing.get_context('spawn').Process(
+            target=run, args=(self.memory.name, seed, left, right, event_log, fixed_point), daemon=True)
+        self.process.start()
+
+    def send(self, left_direction, right_direction):
+        write_control(self.buffer, 'left', recording.direction_codes[left_direction])
+        write_control(self.buffer, 'right', recording.direction_codes[right_direction])
+
+    def pause(self, paused):
+        write_control(self.buffer, 'paused', paused)
+
+    def set_speed(self, multiplier):
+        self.speed = multiplier
+        write_control(self.buffer, 'speed', multiplier)
+
+    def reset(self):
+        self.resets += 1
+        write_control(self.buffer, 'resets', self.resets)
+
+    def read(self):
+        """Bring the match up to date, returns the number of steps it went forward and the events since the last
+        read."""
+        self.check()
+        values = read_state(self.buffer)
+        while values is None:
+            self.check()
+            values = read_state(self.buffer)
+        match = self.match
+        step_count = int(values[0])
+        steps = step_count - match.step_count
+        match.step_count, match.virtual_time, self.stepped_at = step_count, values[1], values[2]
+        match.score = (int(values[3]), int(values[4]))
+        match.showing_winner_screen, match.delaying_kick_off = bool(values[5]), bool(values[6])
+        new_events = []
+        for event, count in zip(events, values[7:10]):
+            if count != self.counts[event]:
+                self.counts[event] = count
+                new_events.append(event)
+        match.ball.restore(values[10:17])
+        match.left_paddle.restore(values[17:24])
+        match.right_paddle.restore(values[24:31])
+        return steps, new_events
+
+    def check(self):
+        if not self.process.is_alive():
+            raise RuntimeError('The physics process stopped with exit code {}'.format(self.process.exitcode))
+
+    def alpha(self):
+        """How far into the next step the physics is, to interpolate with."""
+        return min(1, max(0, (time.perf_counter() - self.stepped_at) * 1000 * self.speed / self.match.delta))
+
+    def close(self):
+        write_control(self.buffer, 'quit', 1)
+        self.process.join()
+        del self.buffer
+        self.memory.close()
+        self.memory.unlink()
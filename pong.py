@@ -1,63 +1,62 @@
 #!/bin/env/python
 """Pong game: """
+import time
+
+# measured before the other imports, pygame's is a good part of the startup
+startup_start = time.perf_counter()
+
+import argparse
 import ctypes
-import math
 import os
 import random
-import time
-from array import array
-from collections import namedtuple
-from functools import partialmethod
+import threading
+from functools import lru_cache
 
 import pygame
 from pygame.locals import *
-from pygame.mixer import Sound, get_init, pre_init
-
-
-def one_period_square_wave_samples(frequency):
-    sample_rate = get_init()[0]
-    period = int(round(sample_rate / frequency))
-    samples = array("h", [0] * period)
-    amplitude = 2 ** (abs(get_init()[1]) - 1) - 1
-    for time in range(period):
-        if time < period / 2:
-            samples[time] = amplitude
-        else:
-            samples[time] = -amplitude
-    return samples
-
-
-def precompute(build_samples_func, frequency, milliseconds):
-    sample_rate = get_init()[0]
-    samples = build_samples_func(frequency)
-    samples_milliseconds = len(samples) / sample_rate * 1000
-    copies = math.ceil(milliseconds / samples_milliseconds)
-    result = samples * copies
-    return result
-
-
-Position = namedtuple('Position', 'x y')
-Vector = namedtuple('Vector', 'x y')
-Size = namedtuple('Size', 'width height')
-Area = namedtuple('Area', 'position size')
-
-
-def pretty_float_pair(self, name, labels):
-    """If labels = ('a', 'b') and self = (1.2345, 1.2345) returns:
-        'name(a=1.23, b=1.23)'"""
-    return '{}({}={:.2f}, {}={:.2f})'.format(name, labels[0], self[0], labels[1], self[1])
-
-
-Position.__str__ = partialmethod(pretty_float_pair, 'Position', ('x', 'y'))
-Vector.__str__ = partialmethod(pretty_float_pair, 'Vector', ('x', 'y'))
-Size.__str__ = partialmethod(pretty_float_pair, 'Size', ('width', 'height'))
+from pygame.mixer import Sound, get_init
+
+import capture
+import controllers
+import eventlog
+import fixedpoint
+import latency
+import multiball
+import recording
+import synthesis
+from pacing import FramePacer
+from profiler import FrameProfiler
+from simulation import Direction, Match, Position, Size, field_size
+
+
+startup_phases = []
+
+
+def startup_phase(name):
+    """Mark the end of a startup phase, for --profile-startup."""
+    startup_phases.append((name, time.perf_counter()))
+
+
+def startup_report():
+    lines = ['Startup to first frame:']
+    previous = startup_start
+    for name, end in startup_phases:
+        lines.append('  {:<16}{:8.1f} ms'.format(name, (end - previous) * 1000))
+        previous = end
+    lines.append('  {:<16}{:8.1f} ms'.format('total', (previous - startup_start) * 1000))
+    if sounds_load_time is not None:
+        lines.append('  {:<16}{:8.1f} ms (in the background)'.format('sounds', sounds_load_time * 1000))
+    else:
+        lines.append('  {:<16}still loading in the background'.format('sounds'))
+    return '\n'.join(lines)
 
 
-class Direction:
-    Up = 0
-    Down = 1
-    Left = 2
-    Right = 3
+def make_sound(waveform, frequency, milliseconds, volume=.1):
+    """A sound for the mixer's current format, synthesized only if it isn't cached already."""
+    sample_rate, size, channels = get_init()
+    sound = Sound(buffer=synthesis.cached_samples(waveform, frequency, milliseconds, sample_rate, size, channels))
+    sound.set_volume(volume)
+    return sound
 
 
 class Color:
@@ -82,240 +81,211 @@ class ColorPalette(Color):
 
 def pixel_scale(pos):
     x, y = pos
-    return Position(int(x / field_size.width * win_w), int(y / field_size.height * win_h))
+    return Position(int(x * scale_x), int(y * scale_y))
 
 
-class Sprite(object):
-    def __init__(self):
-        self.position = Position(0, 0)
-        self.last_draw_position = self.position
-        self.prev_position = self.position
-        self.size = Size(1, 1)
-        self.speed = Vector(0, 0)
-        self.color = ColorPalette.Green
+def use_surface(surface):
+    """Draw on surface from now on: the window, or a framebuffer that present() upscales to it."""
+    global window, win_w, win_h, scale_x, scale_y
+    window = surface
+    win_w, win_h = surface.get_size()
+    scale_x, scale_y = win_w / field_size.width, win_h / field_size.height
 
-    def update(self):
-        self.prev_position = self.position
-        self.position = self.interpolate_next_position()
 
-    def interpolate_next_position(self, alpha=1):
-        return Position(
-            self.position.x + self.speed.x * delta * alpha,
-            self.position.y + self.speed.y * delta * alpha)
+def use_framebuffer(window_surface, factor):
+    """Draw on a framebuffer factor times smaller than the window, so every primitive touches factor squared times
+    fewer pixels, and let present() upscale what changed."""
+    global screen, upscale
+    screen, upscale = window_surface, factor
+    width, height = window_surface.get_size()
+    use_surface(pygame.Surface((width // factor, height // factor)))
+    screen.fill(ColorPalette.Background)
 
-    def interpolate_prev_position(self, alpha=1):
-        return Position(
-            self.position.x * alpha + self.prev_position.x * (1 - alpha),
-            self.position.y * alpha + self.prev_position.y * (1 - alpha))
 
-    def draw(self, alpha=1):
-        self.last_draw_position = self.interpolate_prev_position(alpha)
-        pygame.draw.rect(window, self.color, (pixel_scale(self.last_draw_position), pixel_scale(self.size)))
+def text_pixels(pixels):
+    """Text is sized and placed in window pixels, whatever surface it's drawn on."""
+    return max(1, int(pixels / upscale))
 
-    def clear(self):
-        pygame.draw.rect(window, ColorPalette.Background,
-                         (pixel_scale(self.last_draw_position), pixel_scale(self.size)))
 
-    def collides(self, sprite):
-        rect1 = Rect(pixel_scale(self.position), pixel_scale(self.size))
-        rect2 = Rect(pixel_scale(sprite.position), pixel_scale(sprite.size))
-        return rect1.colliderect(rect2)
+def merge_rects(rects):
+    """Union the rectangles that overlap, like a sprite's clear and draw, so no pixel is upscaled twice."""
+    merged = []
+    for rect in rects:
+        rect = Rect(rect)
+        overlapping = rect.collidelist(merged)
+        while overlapping != -1:
+            rect.union_ip(merged.pop(overlapping))
+            overlapping = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
 
-    def bounce(self, angle):
-        """Bounce off a surface sloped an angle. Assume the objects have collided and try to go back to a position where
-        the objects haven't collided yet. Since one delta (whole physics step) back there was no collision and now there
-        is we go back in time 0.5 delta, on average that is the "correct amount"."""
-        print(self.speed, slope(self.speed))
-        self.position = self.interpolate_prev_position(alpha=0.5)
-        self.speed = reflect(self.speed, angle)
-        print(self.speed, slope(self.speed))
 
+def present(rects):
+    """Show the rectangles drawn this frame: straight from the window or, with a framebuffer, upscaled by an integer
+    factor into the (centered) window one rectangle at a time."""
+    if screen is None:
+        pygame.display.update(rects)
+        return
+    bounds = window.get_rect()
+    offset_x = (screen.get_width() - win_w * upscale) // 2
+    offset_y = (screen.get_height() - win_h * upscale) // 2
+    scaled = []
+    for rect in merge_rects(bounds.clip(rect) for rect in rects):
+        if rect.width and rect.height:
+            target = Rect(offset_x + rect.x * upscale, offset_y + rect.y * upscale,
+                          rect.width * upscale, rect.height * upscale)
+            pygame.transform.scale(window.subsurface(rect), target.size, screen.subsurface(target))
+            scaled.append(target)
+    pygame.display.update(scaled)
 
-def magnitude(vector):
-    return math.sqrt(vector.x ** 2 + vector.y ** 2)
 
+drawn_rects = {}
 
-def slope(vector):
-    return math.degrees(math.atan2(vector.y, vector.x))
 
+def remember(key, rects):
+    """Record the rectangles drawn for key (a sprite or a field element), so they can be cleared exactly."""
+    drawn_rects[key] = rects
+    return rects
 
-def reflect(vector, surface_angle):
-    # reflected_angle = 2 * surface_angle - incident_angle
-    # since a rotation starts at the vector's angle we must subtract it
-    # rotation_angle = 2 * surface_angle - incident_angle - incident_angle
-    #                = 2 * (surface_angle - incident_angle)
-    incident_angle = slope(vector)
-    return rotate(vector, 2 * (surface_angle - incident_angle))
 
+def clear(key):
+    """Restore the background over whatever was drawn for key and return those rectangles."""
+    rects = drawn_rects.pop(key, [])
+    surface = background()
+    window.blits([(surface, rect, rect) for rect in rects], False)
+    return rects
 
-def rotate(vector, angle):
-    return Vector(
-        vector.x * math.cos(math.radians(angle)) - vector.y * math.sin(math.radians(angle)),
-        vector.x * math.sin(math.radians(angle)) + vector.y * math.cos(math.radians(angle)))
 
+@lru_cache(maxsize=4)
+def background_surface(window_size, limits):
+    """The static part of the field: half line and, if toggled, limits. Built once per window size and toggle."""
+    surface = pygame.Surface(window_size)
+    surface.fill(ColorPalette.Background)
+    draw_half_line(surface)
+    if limits:
+        draw_limits(surface)
+    return surface
 
-def center(target, size):
-    return target + size / 2
 
+def background():
+    return background_surface((win_w, win_h), show_limits)
 
-class Paddle(Sprite):
-    def __init__(self, x):
-        super().__init__()
-        self.size = Size(1, 8)
-        self.position = Position(x, center(field_size.height / 2, self.size.height))
-        self.min_speed = 6 / 100
-        self.color = ColorPalette.Paddle
-        self.paddle_parts_update(self.position)
 
-    def paddle_parts_update(self, position):
-        self.top = Area(Position(position.x, position.y), Size(1, 1))
-        self.top_center = Area(Position(position.x, position.y + 1), Size(1, 1))
-        self.center = Area(Position(position.x, position.y + 2), Size(1, 4))
-        self.bottom_center = Area(Position(position.x, position.y + 6), Size(1, 1))
-        self.bottom = Area(Position(position.x, position.y + 7), Size(1, 1))
+def draw_background():
+    """Paint the whole background, when the window is created or after a toggle changes it."""
+    return window.blit(background(), (0, 0))
 
-    def paddle_parts_list(self):
-        return [self.top, self.top_center, self.center, self.bottom_center, self.bottom]
 
-    def paddle_parts_collision_order(self):
-        return [self.top, self.bottom, self.top_center, self.bottom_center, self.center]
+def draw_sprite(sprite, color, alpha=1):
+    sprite.last_draw_position = sprite.interpolate_prev_position(alpha)
+    return remember(sprite, [
+        pygame.draw.rect(window, color, (pixel_scale(sprite.last_draw_position), pixel_scale(sprite.size)))])
 
-    def move(self, input_direction):
-        if input_direction == Direction.Up:
-            self.speed = Vector(0, -self.min_speed)
-        elif input_direction == Direction.Down:
-            self.speed = Vector(0, self.min_speed)
-        else:
-            self.speed = Vector(0, 0)
-
-    def update(self):
-        # restrict paddle movement
-        last_pos = self.position
-        super().update()
-        if self.position.y < -self.size.height + 1 or self.position.y > field_size.height - 1:
-            self.position = last_pos
-        self.paddle_parts_update(self.position)
-
-    def reflection_angle(self, sprite):
-        sprite_rect = Rect(pixel_scale(sprite.position), pixel_scale(sprite.size))
-        edges = 10
-        middle = 5
-        angles = (90 + edges, 90 - edges, 90 + middle, 90 - middle, 90)
-        for part, angle in zip(self.paddle_parts_collision_order(), angles):
-            if sprite_rect.colliderect((pixel_scale(part.position), pixel_scale(part.size))):
-                print("angle={}".format(angle))
-                return angle
-        raise ValueError("The sprite doesn't collide with the paddle")
-
-    def draw(self, alpha):
-        if show_parts:
-            self.last_draw_position = self.interpolate_prev_position(alpha)
-            self.paddle_parts_update(self.last_draw_position)
-            colors = (Color.HalfGray, Color.LightGray, Color.White, Color.LightGray, Color.HalfGray)
-            parts = self.paddle_parts_list()
-            for p, c in zip(parts, colors):
-                x, y = pixel_scale(p.position)
-                w, h = pixel_scale(p.size)
-                pygame.draw.rect(window, c, (x, y, w, h))
-        else:
-            super().draw(alpha)
-
-
-class Ball(Sprite):
-    def __init__(self):
-        super().__init__()
-        self.size = Size(1, 1)
-        self.position = Position(
-            center(field_size.width / 2, self.size.width),
-            center(field_size.height / 2, self.size.height))
-        self.min_speed = 4 / 100
-        self.color = ColorPalette.Ball
-
-    def kick_off(self, direction):
-        """Kick off from the half line between 5% height from the border. If None direction
-        is given, one of the two (Left or Right) will be chosen randomly."""
-        self.position = Position(
-            center(field_size.width / 2, self.size.width),
-            (random.random() * 0.9 + 0.05) * field_size.height)
-        if direction is None:
-            direction = random.choice([Direction.Left, Direction.Right])
-        if direction == Direction.Left:
-            self.speed = Vector(
-                -self.min_speed,
-                (1 - 2 * random.random()) * self.min_speed)
-        if direction == Direction.Right:
-            self.speed = Vector(
-                self.min_speed,
-                (1 - 2 * random.random()) * self.min_speed)
-
-    def start_win_screen(self):
-        """Kick off from in between 5% from each border."""
-        self.position = Position(
-            (random.random() * 0.9 + 0.05) * field_size.width,
-            (random.random() * 0.9 + 0.05) * field_size.height)
-        self.speed = Vector(
-            random.choice([1, -1]) * self.min_speed,
-            random.choice([1, -1]) * self.min_speed)
+
+def clear_sprite(sprite):
+    return clear(sprite)
+
+
+@lru_cache(maxsize=8)
+def ball_surface(size, color, window_size):
+    surface = pygame.Surface(pixel_scale(size))
+    surface.fill(color)
+    return surface
+
+
+def draw_balls(balls, alpha):
+    """Draw many balls at once: the same surface blitted everywhere in a single batch."""
+    if not balls:
+        return remember('balls', [])
+    surface = ball_surface(balls[0].size, ColorPalette.Ball, (win_w, win_h))
+    return remember('balls', window.blits(
+        [(surface, pixel_scale(ball.interpolate_prev_position(alpha))) for ball in balls]))
+
+
+def clear_balls():
+    return clear('balls')
+
+
+def draw_paddle(paddle, alpha):
+    if show_parts:
+        paddle.last_draw_position = paddle.interpolate_prev_position(alpha)
+        colors = (Color.HalfGray, Color.LightGray, Color.White, Color.LightGray, Color.HalfGray)
+        parts = paddle.paddle_parts_list(paddle.last_draw_position)
+        rects = []
+        for p, c in zip(parts, colors):
+            x, y = pixel_scale(p.position)
+            w, h = pixel_scale(p.size)
+            rects.append(pygame.draw.rect(window, c, (x, y, w, h)))
+        return remember(paddle, rects)
+    else:
+        return draw_sprite(paddle, ColorPalette.Paddle, alpha)
 
 
 def draw_field():
-    draw_half_line()
-    draw_score()
-    draw_fps()
-    draw_message()
-    draw_limits()
+    return draw_score() + draw_fps() + draw_profile() + draw_message()
 
 
 def clear_field():
-    clear_half_line()
-    clear_score()
-    clear_fps()
-    clear_message()
-    clear_limits()
+    return clear_score() + clear_fps() + clear_profile() + clear_message()
+
 
+def draw_frame(alpha):
+    """Draw everything that moves or changes over the background, returns the rectangles drawn."""
+    rects = []
+    if isinstance(match, multiball.MultiBallMatch):
+        rects = draw_balls(match.extra_balls, alpha)
+    return (rects + draw_field() + draw_sprite(match.ball, ColorPalette.Ball, alpha) +
+            draw_paddle(match.left_paddle, alpha) + draw_paddle(match.right_paddle, alpha))
 
-def draw_limits():
-    if show_limits:
-        corners = [(1, 1), (field_size.width - 1, 1), (field_size.width - 1, field_size.height - 1),
-                   (1, field_size.height - 1)]
-        corners.append(corners[0])
-        for corner in range(len(corners) - 1):
-            start = pixel_scale(corners[corner])
-            end = pixel_scale(corners[corner + 1])
-            pygame.draw.line(window, ColorPalette.Score, start, end, 1)
 
+def clear_frame():
+    """Undo draw_frame, returns the rectangles cleared."""
+    return (clear_balls() + clear_field() + clear_sprite(match.ball) + clear_sprite(match.left_paddle) +
+            clear_sprite(match.right_paddle))
 
-def clear_limits():
+
+def draw_limits(surface):
     corners = [(1, 1), (field_size.width - 1, 1), (field_size.width - 1, field_size.height - 1),
                (1, field_size.height - 1)]
     corners.append(corners[0])
     for corner in range(len(corners) - 1):
         start = pixel_scale(corners[corner])
         end = pixel_scale(corners[corner + 1])
-        pygame.draw.line(window, ColorPalette.Background, start, end, 1)
+        pygame.draw.line(surface, ColorPalette.Score, start, end, 1)
 
 
 def draw_fps():
-    global fps_font
-    global text_surface
+    rects = []
     if show_fps:
-        elapsed = time.clock() - t0
+        elapsed = time.perf_counter() - t0
         if elapsed == 0:
             fps = 0.0
         else:
             fps = frame_count / elapsed
-        text_surface = fps_font.render('FPS: {:04.2f} - {:04.2f} VT: {:.2f}'.format(
-            fps, my_clock.get_fps(), virtual_time), True, Color.Green)
-        window.blit(text_surface, (20, 20))
+        rects.append(draw_text('FPS: {:04.2f} - {:04.2f} VT: {:.2f} R: {}{}'.format(
+            fps, pacer.fps(), match.virtual_time, pacer.rate, '' if pacer.interpolate else ' no interp'),
+            font(text_pixels(20)), Color.Green,
+            (text_pixels(20), text_pixels(20))))
+    return remember('fps', rects)
 
 
 def clear_fps():
-    if text_surface is not None:
-        x, y, w, h = text_surface.get_rect()
-        window.fill(ColorPalette.Background, (20, 20, w, h))
+    return clear('fps')
+
+
+def draw_profile():
+    rects = []
+    if show_profile:
+        for line_number, line in enumerate(profiler.overlay_lines()):
+            rects.append(draw_text(line, font(text_pixels(20)), Color.Green,
+                                   (text_pixels(20), text_pixels(50 + 25 * line_number))))
+    return remember('profile', rects)
+
+
+def clear_profile():
+    return clear('profile')
 
 
-message_surface = None
 message = None
 message_duration = 3000
 ERASEMESSAGE = pygame.USEREVENT + 2
@@ -337,61 +307,100 @@ def erase_message():
 
 
 def draw_message():
-    global big_font
-    global message_surface
+    rects = []
     if message is not None:
-        message_surface = big_font.render(message, True, Color.Blue)
+        message_surface = render_text(message, font(text_pixels(60)), Color.Blue)
         box = message_surface.get_rect()
         box.centerx = win_w / 2
         box.centery = win_h / 2
-        window.blit(message_surface, box)
+        rects.append(window.blit(message_surface, box))
+    return remember('message', rects)
 
 
 def clear_message():
-    if message_surface is not None:
-        box = message_surface.get_rect()
-        box.centerx = win_w / 2
-        box.centery = win_h / 2
-        window.fill(ColorPalette.Background, box)
+    return clear('message')
 
 
-def draw_half_line():
+def draw_half_line(surface):
     segments = 30
     segment_length = (field_size.height - 1) / segments
     for segment in range(segments):
         start = pixel_scale((field_size.width / 2, segment_length * segment + 1))
         end = pixel_scale((field_size.width / 2, segment_length * segment + (3 / 4 * segment_length)))
-        pygame.draw.line(window, ColorPalette.HalfLine, start, end, 2)
-
-
-def clear_half_line():
-    start = pixel_scale((field_size.width / 2, 0))
-    end = pixel_scale((field_size.width / 2, field_size.height))
-    pygame.draw.line(window, ColorPalette.Background, start, end, 2)
+        pygame.draw.line(surface, ColorPalette.HalfLine, start, end, 2)
 
 
 def draw_score():
-    left, right = score
-    draw_number(left, Position(50, 10), Size(8, 10), ColorPalette.Score)
-    draw_number(right, Position(130, 10), Size(8, 10), ColorPalette.Score)
+    left, right = match.score
+    return remember('score', draw_number(left, Position(50, 10), Size(8, 10), ColorPalette.Score) +
+                    draw_number(right, Position(130, 10), Size(8, 10), ColorPalette.Score))
 
 
 def clear_score():
-    left, right = score
-    draw_number(left, Position(50, 10), Size(8, 10), ColorPalette.Background)
-    draw_number(right, Position(130, 10), Size(8, 10), ColorPalette.Background)
+    return clear('score')
+
+
+def draw_dirty_rects(rects):
+    """Debug overlay: outline the rectangles that are being sent to the display this frame."""
+    return remember('dirty_rects', [pygame.draw.rect(window, Color.Red, rect, 1) for rect in rects if rect])
+
+
+def clear_dirty_rects():
+    return clear('dirty_rects')
 
 
 def draw_number(number, pos, size, color):
     digits = str(number)
     x_offset = 10
     next_draw_pos = pos
+    rects = []
     for digit in digits:
-        draw_digit(int(digit), next_draw_pos, size, color)
+        rects.append(draw_digit(int(digit), next_draw_pos, size, color))
         next_draw_pos = Position(next_draw_pos.x + x_offset, next_draw_pos.y)
+    return rects
+
+
+@lru_cache(maxsize=None)
+def font(size):
+    """Looking up system fonts is slow, so they are only loaded when some text is first shown."""
+    pygame.font.init()
+    return pygame.font.SysFont('couriernew', size)
+
+
+@lru_cache(maxsize=128)
+def render_text(text, font, color):
+    """Cached font.render, the surface is reused as long as the text, font and color don't change."""
+    return font.render(text, True, color)
+
+
+def draw_text(text, font, color, pos):
+    """Blit text one cached glyph at a time, for text that changes every frame like the FPS counter."""
+    x, y = pos
+    height = 0
+    for char in text:
+        glyph = render_text(char, font, color)
+        window.blit(glyph, (x, y))
+        x += glyph.get_width()
+        height = max(height, glyph.get_height())
+    return Rect(pos, (x - pos[0], height))
 
 
 def draw_digit(digit, pos, size, color):
+    return window.blit(digit_surface(digit, size, color, (win_w, win_h)), pixel_scale(pos))
+
+
+@lru_cache(maxsize=64)
+def digit_surface(digit, size, color, window_size):
+    """The digit's segments drawn once on their own surface. window_size is only part of the cache key, since
+    the pixel size of the segments depends on it."""
+    surface = pygame.Surface(pixel_scale((size.width + 1, size.height + 1)))
+    surface.fill(ColorPalette.Background)
+    for segment in digit_segments(digit):
+        draw_segment(segment, Position(0, 0), size, color, surface)
+    return surface
+
+
+def digit_segments(digit):
     # 7 segments:
     #    a
     #    _
@@ -422,11 +431,10 @@ def draw_digit(digit, pos, size, color):
         segments = 'abcdfg'
     else:
         raise ValueError('Invalid digit: '.format(digit))
-    for segment in segments:
-        draw_segment(segment, pos, size, color)
+    return segments
 
 
-def draw_segment(segment, pos, size, color):
+def draw_segment(segment, pos, size, color, surface):
     # 7 segments:
     #    a
     #    _
@@ -460,232 +468,423 @@ def draw_segment(segment, pos, size, color):
     start_px = pixel_scale(start)
     size_px = pixel_scale(Position(finish.x - start.x + line_width.x, finish.y - start.y + line_width.y))
     box = Rect(start_px, size_px)
-    window.fill(color, box)
+    return surface.fill(color, box)
 
 
-def init_window():
+def init_window(size=(1500, 1000)):
     app_id = 'diegorodriguezv.pong.1'  # arbitrary string
     # show the correct taskbar icon in windows
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(app_id)
+    if os.name == 'nt':
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(app_id)
     # os.environ['SDL_VIDEO_CENTERED'] = '1'
     position = 410, 30
     os.environ['SDL_VIDEO_WINDOW_POS'] = str(position[0]) + "," + str(position[1])
-    pre_init(44100, -16, 1)
-    pygame.init()
-    pygame.display.set_icon(pygame.image.load('img/icon.png'))
-    result_window = pygame.display.set_mode((1500, 1000))
+    pygame.display.init()
+    pygame.display.set_icon(pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'img/icon.png')))
+    result_window = pygame.display.set_mode(size)
     pygame.display.set_caption('Pong')
     result_window.fill(ColorPalette.Background)
     return result_window
 
 
-window = init_window()
-win_w, win_h = window.get_size()
-text_surface = None
-fps_font = pygame.font.SysFont('couriernew', 20)
-big_font = pygame.font.SysFont('couriernew', 60)
-hit_wall_sound = Sound(precompute(one_period_square_wave_samples, frequency=226, milliseconds=16))
-hit_wall_sound.set_volume(.1)
-hit_paddle_sound = Sound(precompute(one_period_square_wave_samples, frequency=459, milliseconds=96))
-hit_paddle_sound.set_volume(.1)
-goal_sound = Sound(precompute(one_period_square_wave_samples, frequency=490, milliseconds=257))
-goal_sound.set_volume(.1)
-field_size = Size(width=180, height=100)
-left_paddle = Paddle(10)
-right_paddle = Paddle(170)
-ball = Ball()
-ball.kick_off(None)
-left_direction, right_direction = None, None
-score = (0, 0)
-KICKOFF = pygame.USEREVENT + 1
-ready_to_kick_off = False
-delaying_kick_off = False
-kick_off_direction = None
-showing_winner_screen = False
-speed_multipliers = [("1/64 X", 1 / 64), ("1/32 X", 1 / 32), ("1/16 X", 1 / 16), ("1/8 X", 1 / 8), ("1/4 X", 1 / 4),
-                     ("1/2 X", 1 / 2), ("1 X", 1), ("1.5 X", 3 / 2), ("2 X", 2), ("4 X", 4), ("8 X", 8)]
-speed_multiplier_index = 6
-constant_delta = 1 / 24 * 1000
-delta = constant_delta
-t0 = time.clock()
+sounds = {}
+sounds_load_time = None
+
+
+def load_sounds():
+    """Make the sounds for the open mixer, in the background: a sound that isn't ready yet just doesn't play."""
+    global sounds_load_time
+    start = time.perf_counter()
+    sounds['hit_wall'] = make_sound('square', frequency=226, milliseconds=16)
+    sounds['hit_paddle'] = make_sound('square', frequency=459, milliseconds=96)
+    sounds['goal'] = make_sound('square', frequency=490, milliseconds=257)
+    sounds_load_time = time.perf_counter() - start
+
+
+def play_sound(event):
+    if event in sounds:
+        sounds[event].play()
+
+
+# set up by the main block, or by whatever else drives the renderer
+window = None
+win_w, win_h = 0, 0
+scale_x, scale_y = 0, 0
+# the window and the factor it's upscaled by when drawing on a framebuffer
+screen = None
+upscale = 1
+match = None
+# toggled with keys in the main loop
 show_fps = False
 show_limits = False
 show_parts = False
-my_clock = pygame.time.Clock()
-virtual_time = 0
-time_accumulator = 0
-frame_count = 0
-interpolation = True
-skipping = False
-pause = False
-alive = True
-while alive:
-    frame_time = my_clock.tick(120)
-    max_skip_frame = 5
-    overwhelmed = frame_time > max_skip_frame * delta
-    if overwhelmed:
-        pause_before = pause
-        pause = True
-        skipping = True
-    if skipping:
-        if not overwhelmed:
-            pause = pause_before
-            skipping = False
-    for input_event in pygame.event.get():
-        if input_event.type == QUIT:
-            alive = False
-            break
-        elif input_event.type == KEYDOWN:
-            if input_event.key == K_ESCAPE:
+show_dirty_rects = False
+show_profile = False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='A classic pong game')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print how long each startup phase took until the first frame')
+    parser.add_argument('--trace-latency', action='store_true',
+                        help='trace the players\' inputs to the screen and print their latency at exit')
+    parser.add_argument('--capture', metavar='PATH',
+                        help='capture the rendered frames to PATH: raw video, or a PNG sequence if it ends with .png')
+    parser.add_argument('--capture-every', type=int, default=1, metavar='N', help='capture every Nth rendered frame')
+    parser.add_argument('--event-log', metavar='LOG',
+                        help='log the bounces, goals, kick offs, speed changes and pauses to LOG (see eventlog.py)')
+    parser.add_argument('--precise-pacing', action='store_true',
+                        help='poll the timer for the last millisecond of each frame: steadier frames, more CPU')
+    parser.add_argument('--profile-frames', metavar='CSV',
+                        help='write the time of each phase of every frame to CSV on exit')
+    parser.add_argument('--left', default='impossible', choices=sorted(controllers.factories),
+                        help='controller of the left paddle (default: impossible)')
+    parser.add_argument('--right', choices=sorted(controllers.factories),
+                        help='controller of the right paddle, instead of the arrow keys')
+    parser.add_argument('--record', metavar='FILE', help='record the inputs of the match to FILE')
+    parser.add_argument('--replay', metavar='FILE', help='replay a recording instead of playing')
+    parser.add_argument('--upscale', type=int, default=1, metavar='FACTOR',
+                        help='draw on a framebuffer FACTOR times smaller than the window and upscale it')
+    parser.add_argument('--balls', type=int, default=0, metavar='N',
+                        help='party mode: N more balls, that bounce off each other too')
+    parser.add_argument('--physics-process', action='store_true',
+                        help='run the physics in a process of its own, so rendering can\'t slow it down')
+    parser.add_argument('--fixed-point', action='store_true',
+                        help='integer physics that play out the same on any machine (a host decides for its game)')
+    parser.add_argument('--host', type=int, metavar='PORT',
+                        help='wait for another player to --join on PORT and play the left paddle (w, s) against them')
+    parser.add_argument('--join', metavar='HOST:PORT', help='join a --host and play the right paddle (arrow keys)')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='network play: milliseconds to hold back everything sent, to try out a slow network')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='network play: milliseconds of random variation of the latency')
+    args = parser.parse_args()
+    if (args.host or args.join) and (args.record or args.replay):
+        parser.error('network games cannot be recorded or replayed')
+    if args.balls and (args.host or args.join or args.record or args.replay):
+        parser.error('party mode is only for local games')
+    if args.physics_process and (args.host or args.join or args.record or args.replay or args.balls):
+        parser.error('the physics process is only for local games of one ball')
+    if args.fixed_point and args.balls:
+        parser.error('party mode has no fixed-point physics')
+    startup_phase('imports')
+    # asyncio and multiprocessing are a good part of the startup, only load them for the games that need them
+    if args.host or args.join:
+        import netplay
+    if args.physics_process:
+        import physicsproc
+    connection, session = None, None
+    if args.host:
+        print('waiting for a player to join on port {}'.format(args.host))
+        connection = netplay.connect(None, args.host, args.latency, args.jitter, args.fixed_point)
+    elif args.join:
+        address, _, port = args.join.rpartition(':')
+        connection = netplay.connect(address, int(port), args.latency, args.jitter)
+    if connection is not None:
+        startup_phase('connection')
+    if args.upscale > 1:
+        use_framebuffer(init_window(), args.upscale)
+    else:
+        use_surface(init_window())
+    startup_phase('window')
+    # SDL's subsystems are initialized on the main thread, only the synthesis runs in the background
+    try:
+        pygame.mixer.init(44100, -16, 1)
+    except pygame.error as error:
+        print('no sound: {}'.format(error))
+    else:
+        threading.Thread(target=load_sounds, daemon=True).start()
+    startup_phase('mixer')
+    frame_capture = None
+    if args.capture:
+        frame_capture = capture.FrameCapture(window, args.capture, args.capture_every)
+    recorder, replay, physics = None, None, None
+    if connection is not None:
+        match = connection.new_match(on_event=play_sound)
+        session = netplay.Session(match, connection.side)
+    elif args.replay:
+        replay_recording = recording.Recording(args.replay)
+        replay = recording.actions(replay_recording.records())
+        match = recording.new_match(replay_recording, on_event=play_sound)
+    else:
+        seed = random.randrange(2 ** 64)
+        if args.physics_process:
+            physics = physicsproc.PhysicsProcess(seed, args.left, args.right, args.event_log,
+                                                 args.fixed_point)
+            match = physics.match
+        elif args.balls:
+            match = multiball.MultiBallMatch(args.balls, seed=seed, on_event=play_sound)
+        else:
+            match = (fixedpoint.FixedMatch if args.fixed_point else Match)(seed=seed, on_event=play_sound)
+        if args.record:
+            recorder = recording.Recorder(args.record, seed, match.delta, args.fixed_point)
+    event_log = None
+    # the physics process logs its own events
+    if args.event_log and physics is None:
+        event_log = match.event_log = eventlog.EventLog(args.event_log)
+    # both paddles are played by people in network games, the physics process runs its own controllers
+    left_control = controllers.make(args.left) if connection is None and physics is None else None
+    right_control = controllers.make(args.right) if args.right and connection is None and physics is None else None
+    startup_phase('match')
+    left_direction, right_direction = None, None
+    # the sides played from the keyboard
+    if replay is not None:
+        traced_sides = ()
+    elif session is not None:
+        traced_sides = (session.side,)
+    else:
+        traced_sides = tuple(side for side, name in (('left', args.left), ('right', args.right)) if not name)
+    tracer = latency.LatencyTracer() if args.trace_latency else None
+    speed_multipliers = [("1/64 X", 1 / 64), ("1/32 X", 1 / 32), ("1/16 X", 1 / 16), ("1/8 X", 1 / 8),
+                         ("1/4 X", 1 / 4), ("1/2 X", 1 / 2), ("1 X", 1), ("1.5 X", 3 / 2), ("2 X", 2), ("4 X", 4),
+                         ("8 X", 8)]
+    speed_multiplier_index = 6
+    if recorder is not None:
+        recorder.speed(speed_multipliers[speed_multiplier_index][1])
+    t0 = time.perf_counter()
+    profiler = FrameProfiler()
+    pacer = FramePacer(spin=0.001 if args.precise_pacing else 0)
+    time_accumulator = 0
+    frame_count = 0
+    interpolation = True
+    fast_forward = False
+    pause = False
+    # the match stays as the recording left it, unpausing doesn't turn it back into a game
+    replay_finished = False
+    alive = True
+    draw_background()
+    startup_phase('background')
+    present([window.get_rect()])
+    while alive:
+        profiler.start_frame()
+        frame_time = pacer.wait()
+        profiler.mark('tick')
+        repaint = []
+        input_events = pygame.event.get()
+        if tracer is not None:
+            tracer.poll()
+            directions_before = left_direction, right_direction
+        for input_event in input_events:
+            if input_event.type == QUIT:
                 alive = False
                 break
-            elif input_event.key == K_UP:
-                right_direction = Direction.Up
-            elif input_event.key == K_DOWN:
-                right_direction = Direction.Down
-            elif input_event.key == K_w:
-                left_direction = Direction.Up
-            elif input_event.key == K_s:
-                left_direction = Direction.Down
-            elif input_event.key == K_p:
-                pause = not pause
-                if pause:
-                    message = "PAUSE"
-                else:
-                    message = None
-            elif input_event.key == K_l:
-                show_limits = not show_limits
-            elif input_event.key == K_f:
-                show_fps = not show_fps
-            elif input_event.key == K_i:
-                interpolation = not interpolation
-            elif input_event.key == K_d:
-                show_parts = not show_parts
-            elif input_event.key == K_r:
-                showing_winner_screen = False
-                delaying_kick_off = True
-                kick_off_direction = None
-                virtual_time = 0
-                score = (0, 0)
-                window.fill(ColorPalette.Background)
-                ball.speed = Vector(0, 0)
-                ball.position = Position(5000, 50)  # hide ball
-                left_paddle.position = Position(10, field_size.height / 2)
-                right_paddle.position = Position(170, field_size.height / 2)
-                pygame.time.set_timer(KICKOFF, 1000)
-            elif input_event.key == K_z:
-                if speed_multiplier_index > 0:
-                    speed_multiplier_index -= 1
-                display_message_duration("{}".format(speed_multipliers[speed_multiplier_index][0]))
-            elif input_event.key == K_x:
-                if speed_multiplier_index <= len(speed_multipliers) - 2:
-                    speed_multiplier_index += 1
-                display_message_duration("{}".format(speed_multipliers[speed_multiplier_index][0]))
-        elif input_event.type == KEYUP:
-            if input_event.key == K_UP:
-                right_direction = None
-            elif input_event.key == K_DOWN:
-                right_direction = None
-            elif input_event.key == K_w:
-                left_direction = None
-            elif input_event.key == K_s:
-                left_direction = None
-        elif input_event.type == KICKOFF:
-            ready_to_kick_off = True
-        elif input_event.type == ERASEMESSAGE:
-            erase_message()
-    # 'impossible ai' moves left paddle, with a little wiggle room to reduce shakiness
-    if center(left_paddle.position.y, left_paddle.size.height) < center(ball.position.y, ball.size.height) - 1.3:
-        left_direction = Direction.Down
-    elif center(left_paddle.position.y, left_paddle.size.height) > center(ball.position.y, ball.size.height) + 1.3:
-        left_direction = Direction.Up
-    else:
-        left_direction = None
-    clear_field()
-    ball.clear()
-    left_paddle.clear()
-    right_paddle.clear()
-    if not pause:
-        time_accumulator += frame_time * speed_multipliers[speed_multiplier_index][1]
-        delta = constant_delta
-        while time_accumulator >= delta:
-            time_accumulator -= delta
-            virtual_time += delta
-            left_paddle.move(left_direction)
-            right_paddle.move(right_direction)
-            ball.update()
-            left_paddle.update()
-            right_paddle.update()
-            if showing_winner_screen:
-                if ball.position.y <= 1.1:
-                    ball.bounce(0)
-                if ball.position.y + ball.size.height >= field_size.height - 1:
-                    ball.bounce(0)
-                if ball.position.x <= 1.1:
-                    ball.bounce(90)
-                if ball.position.x + ball.size.width >= field_size.width - 1:
-                    ball.bounce(90)
+            elif input_event.type == KEYDOWN:
+                if input_event.key == K_ESCAPE:
+                    alive = False
+                    break
+                elif input_event.key == K_UP:
+                    right_direction = Direction.Up
+                elif input_event.key == K_DOWN:
+                    right_direction = Direction.Down
+                elif input_event.key == K_w:
+                    left_direction = Direction.Up
+                elif input_event.key == K_s:
+                    left_direction = Direction.Down
+                elif input_event.key == K_p:
+                    pause = not pause
+                    if pause:
+                        message = "PAUSE"
+                    else:
+                        message = None
+                    if event_log is not None:
+                        event_log.pause(match.virtual_time, pause)
+                    if physics is not None:
+                        physics.pause(pause)
+                elif input_event.key == K_l:
+                    show_limits = not show_limits
+                    repaint.append(draw_background())
+                elif input_event.key == K_f:
+                    show_fps = not show_fps
+                elif input_event.key == K_i:
+                    interpolation = not interpolation
+                elif input_event.key == K_d:
+                    show_parts = not show_parts
+                elif input_event.key == K_u:
+                    show_dirty_rects = not show_dirty_rects
+                elif input_event.key == K_t:
+                    show_profile = not show_profile
+                elif input_event.key == K_g and session is None and physics is None:
+                    fast_forward = not fast_forward
+                    display_message_duration("FAST FORWARD" if fast_forward else "FIXED STEPS")
+                elif input_event.key == K_r and replay is None and session is None:
+                    repaint.append(draw_background())
+                    if physics is not None:
+                        physics.reset()
+                    else:
+                        match.reset()
+                    if tracer is not None:
+                        tracer.cancel()
+                    if recorder is not None:
+                        recorder.reset()
+                elif input_event.key == K_z:
+                    if speed_multiplier_index > 0:
+                        speed_multiplier_index -= 1
+                    display_message_duration("{}".format(speed_multipliers[speed_multiplier_index][0]))
+                    if recorder is not None:
+                        recorder.speed(speed_multipliers[speed_multiplier_index][1])
+                    if event_log is not None:
+                        event_log.speed(match.virtual_time, speed_multipliers[speed_multiplier_index][1])
+                    if physics is not None:
+                        physics.set_speed(speed_multipliers[speed_multiplier_index][1])
+                elif input_event.key == K_x:
+                    if speed_multiplier_index <= len(speed_multipliers) - 2:
+                        speed_multiplier_index += 1
+                    display_message_duration("{}".format(speed_multipliers[speed_multiplier_index][0]))
+                    if recorder is not None:
+                        recorder.speed(speed_multipliers[speed_multiplier_index][1])
+                    if event_log is not None:
+                        event_log.speed(match.virtual_time, speed_multipliers[speed_multiplier_index][1])
+                    if physics is not None:
+                        physics.set_speed(speed_multipliers[speed_multiplier_index][1])
+            elif input_event.type == KEYUP:
+                if input_event.key == K_UP:
+                    right_direction = None
+                elif input_event.key == K_DOWN:
+                    right_direction = None
+                elif input_event.key == K_w:
+                    left_direction = None
+                elif input_event.key == K_s:
+                    left_direction = None
+            elif input_event.type == ERASEMESSAGE:
+                erase_message()
+        if tracer is not None:
+            for side, before, after in zip(('left', 'right'), directions_before, (left_direction, right_direction)):
+                if after != before and side in traced_sides:
+                    tracer.input(side, after, match)
+        profiler.mark('events')
+        if left_control is not None:
+            left_direction = left_control(match.left_paddle, match.ball)
+        if right_control is not None:
+            right_direction = right_control(match.right_paddle, match.ball)
+        profiler.mark('ai')
+        steps = 0
+        if physics is not None:
+            # the physics keeps its own time, draw the latest state it got to
+            physics.send(left_direction, right_direction)
+            try:
+                steps, physics_events = physics.read()
+            except RuntimeError as error:
+                print(error)
+                alive = False
+                physics_events = ()
+            for event in physics_events:
+                play_sound(event)
+        elif not pause:
+            frame_game_time = frame_time * speed_multipliers[speed_multiplier_index][1]
+            time_accumulator += frame_game_time
+            # fast forwarding costs the same however long the frame was, stepping has to catch up gradually
+            if not fast_forward:
+                time_accumulator = pacer.clamp(time_accumulator)
+            max_steps = pacer.max_steps(frame_game_time, match.delta)
+            if replay is not None:
+                # the recording sets the pace: a fast forward takes as long as the steps it jumped over
+                while not replay_finished and time_accumulator >= match.delta and steps < max_steps:
+                    action = next(replay, None)
+                    if action is None:
+                        replay_finished = True
+                        pause = True
+                        message = "REPLAY END"
+                        break
+                    multipliers = [multiplier for _, multiplier in speed_multipliers]
+                    if action[0] == 'speed' and action[1] in multipliers:
+                        speed_multiplier_index = multipliers.index(action[1])
+                        if event_log is not None:
+                            event_log.speed(match.virtual_time, action[1])
+                    elif action[0] == 'reset':
+                        repaint.append(draw_background())
+                    action_steps = recording.apply(match, action)
+                    time_accumulator -= action_steps * match.delta
+                    steps += action_steps
+                if replay_finished:
+                    time_accumulator = 0
+            elif session is not None:
+                connection.deliver(session)
+                session.rollback()
+                local_direction = left_direction if session.side == 'left' else right_direction
+                while time_accumulator >= match.delta and session.can_advance():
+                    time_accumulator -= match.delta
+                    if session.advance(local_direction):
+                        connection.send_input(match.step_count - 1, local_direction)
+                    if match.step_count % netplay.sync_interval == 0:
+                        connection.send_sync(match.step_count)
+                    steps += 1
+                # waiting for the other player, don't save up the time
+                time_accumulator = min(time_accumulator, match.delta)
+                if connection.closed and message is None:
+                    message = "DISCONNECTED"
+            elif fast_forward:
+                # the inputs don't change within a frame, jump over all of its steps at once
+                ff_steps = int(time_accumulator // match.delta)
+                # a frame shorter than a step has nothing to jump over, and the paddle inputs it would set would be
+                # missing from the recording
+                if ff_steps:
+                    time_accumulator -= ff_steps * match.delta
+                    match.fast_forward(ff_steps * match.delta, left_direction, right_direction)
+                    steps += ff_steps
+                    if recorder is not None:
+                        recorder.fast_forward(ff_steps, left_direction, right_direction)
             else:
-                if ball.position.y <= 1.1:
-                    ball.bounce(0)
-                    hit_wall_sound.play()
-                if ball.position.y + ball.size.height >= field_size.height - 1:
-                    ball.bounce(0)
-                    hit_wall_sound.play()
-                if ball.collides(left_paddle):
-                    ball.bounce(90)
-                    hit_paddle_sound.play()
-                if ball.collides(right_paddle):
-                    angle = right_paddle.reflection_angle(ball)
-                    ball.bounce(angle)
-                    hit_paddle_sound.play()
-                if ball.position.x <= 1.1:
-                    if not delaying_kick_off:
-                        score = score[0], score[1] + 1
-                        goal_sound.play()
-                        delaying_kick_off = True
-                        kick_off_direction = Direction.Left
-                        pygame.time.set_timer(KICKOFF, 2000)
-                        ball.speed = Vector(0, 0)
-                        ball.position = Position(5000, 50)  # hide ball
-                if ball.position.x + ball.size.width >= field_size.width - 1:
-                    if not delaying_kick_off:
-                        score = score[0] + 1, score[1]
-                        goal_sound.play()
-                        delaying_kick_off = True
-                        kick_off_direction = Direction.Right
-                        pygame.time.set_timer(KICKOFF, 2000)
-                        ball.speed = Vector(0, 0)
-                        ball.position = Position(5000, 50)  # hide ball
-            if any(s == 11 for s in score):
-                if not showing_winner_screen:
-                    pygame.time.set_timer(KICKOFF, 0)
-                    left_paddle.position = Position(5000, 50)
-                    right_paddle.position = Position(5000, 50)
-                    showing_winner_screen = True
-                    ball.start_win_screen()
-            if ready_to_kick_off:
-                pygame.time.set_timer(KICKOFF, 0)
-                ready_to_kick_off = False
-                delaying_kick_off = False
-                ball.kick_off(kick_off_direction)
-    # alpha is a value between 0 and 1 that represents the portion of delta that has passed since last update
-    if interpolation:
-        alpha = time_accumulator / constant_delta
-    else:
-        alpha = 1
-    frame_count += 1
-    draw_field()
-    ball.draw(alpha)
-    left_paddle.draw(alpha)
-    right_paddle.draw(alpha)
-    pygame.display.update()
-
-# todo: bug: reset (r key) leaves parts of the screen painted
-# todo: bug: a few lines are left painted on the screen after paddle moves fast, only when interpolating and drawing parts
-# todo: bug: ball slides over bottom (when kicked off precisely), the hit sound repeats all the way
-# todo: bug: when the ball collides with the paddle diagonally ball bounces back and forth around the paddle
-# todo: make tests for the bugs (kick_off parameters + paddle positions)
+                while time_accumulator >= match.delta and steps < max_steps:
+                    time_accumulator -= match.delta
+                    match.step(left_direction, right_direction)
+                    steps += 1
+                    if recorder is not None:
+                        recorder.step(left_direction, right_direction)
+        if tracer is not None:
+            tracer.stepped(match)
+        profiler.mark('physics')
+        interpolating = interpolation and pacer.interpolate
+        # without interpolation nothing moves unless there was a step
+        render = interpolating or steps or repaint or pause or frame_count == 0
+        dirty_rects = []
+        if render:
+            repaint += clear_dirty_rects()
+            dirty_rects = clear_frame()
+        profiler.mark('clear')
+        if render:
+            # alpha is a value between 0 and 1 that represents the portion of delta that has passed since last update
+            if interpolating and physics is not None:
+                alpha = physics.alpha()
+            elif interpolating:
+                alpha = time_accumulator / match.delta
+            else:
+                alpha = 1
+            frame_count += 1
+            dirty_rects += draw_frame(alpha)
+            if show_dirty_rects:
+                repaint += draw_dirty_rects(dirty_rects)
+        profiler.mark('draw')
+        if render:
+            if tracer is not None:
+                tracer.presenting(match.virtual_time - (1 - alpha) * match.delta)
+            present(dirty_rects + repaint)
+            if tracer is not None:
+                tracer.presented()
+            if frame_capture is not None:
+                frame_capture.capture()
+        profiler.end_frame(steps)
+        durations = profiler.durations
+        pacer.record(durations['physics'][-1] / 1e6,
+                     sum(durations[phase][-1] for phase in ('clear', 'draw', 'display')) / 1e6 if render else None)
+        if frame_count == 1 and args.profile_startup:
+            startup_phase('first frame')
+            print(startup_report())
+    if args.profile_frames:
+        profiler.write_csv(args.profile_frames)
+    if tracer is not None:
+        print(tracer.report())
+    if frame_capture is not None:
+        print(frame_capture.close())
+    if event_log is not None:
+        print(event_log.close())
+    if recorder is not None:
+        recorder.close()
+    if connection is not None:
+        connection.link.close()
+    if physics is not None:
+        physics.close()
+    if args.record or args.replay:
+        print('state {}'.format(recording.state_digest(match)))
+
 # todo: boolean flags should be renamed is_whatever
-# todo: bounce() could calculate the exact point of impact but it doesn't matter as long as drawing is interpolating between two states
 # todo: interpolate between two states using an intermediate "marker" state to show the exact point of impact
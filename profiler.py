@@ -0,0 +1,75 @@
+"""Frame profiler: times each phase of every frame of the main loop with perf_counter_ns, keeps a record per frame and
+writes them to CSV."""
+import csv
+import time
+from array import array
+
+phases = ('tick', 'events', 'ai', 'physics', 'clear', 'draw', 'display')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class FrameProfiler(object):
+    """Call start_frame() before the frame's first phase, mark(phase) at the end of each phase, in the order of phases,
+    and end_frame(steps) at the end of the last one with the number of physics steps taken."""
+
+    def __init__(self, recent=240):
+        self.recent = recent
+        self.starts = array('q')
+        self.steps = array('l')
+        self.durations = {phase: array('q') for phase in phases}
+        self.totals = array('q')
+        self.frame_start = None
+        self.last_mark = None
+
+    def start_frame(self):
+        self.frame_start = self.last_mark = time.perf_counter_ns()
+
+    def mark(self, phase):
+        now = time.perf_counter_ns()
+        self.durations[phase].append(now - self.last_mark)
+        self.last_mark = now
+
+    def end_frame(self, steps):
+        self.mark(phases[-1])
+        self.starts.append(self.frame_start)
+        self.steps.append(steps)
+        self.totals.append(self.last_mark - self.frame_start)
+
+    def frame_percentiles(self):
+        """p50, p95 and p99 of the recent frame times, in milliseconds."""
+        recent = sorted(self.totals[-self.recent:])
+        return tuple(percentile(recent, fraction) / 1e6 for fraction in (0.5, 0.95, 0.99))
+
+    def phase_means(self):
+        """Mean milliseconds of each phase in the recent frames."""
+        means = {}
+        for phase in phases:
+            recent = self.durations[phase][-self.recent:]
+            means[phase] = sum(recent) / len(recent) / 1e6 if recent else 0
+        return means
+
+    def overlay_lines(self):
+        p50, p95, p99 = self.frame_percentiles()
+        means = self.phase_means()
+        recent_steps = self.steps[-self.recent:]
+        steps = sum(recent_steps) / len(recent_steps) if recent_steps else 0
+        return ['frame p50 {:.2f} p95 {:.2f} p99 {:.2f} ms'.format(p50, p95, p99),
+                ' '.join('{} {:.2f}'.format(phase, means[phase]) for phase in phases) + ' ms',
+                'physics steps/frame {:.2f}'.format(steps)]
+
+    def write_csv(self, path):
+        """One row per frame: its start (nanoseconds since the first frame), physics steps, the nanoseconds of each
+        phase and of the whole frame."""
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(('frame', 'start_ns', 'steps') + tuple(phase + '_ns' for phase in phases) + ('total_ns',))
+            first = self.starts[0] if self.starts else 0
+            for frame in range(len(self.totals)):
+                writer.writerow((frame, self.starts[frame] - first, self.steps[frame]) +
+                                tuple(self.durations[phase][frame] for phase in phases) + (self.totals[frame],))
@@ -0,0 +1,229 @@
+"""Input recordings: the seed of a Match and, for every physics step, the paddle inputs, plus the fast forwards, resets
+and speed changes. A Match is deterministic given those, so a recording replays the game bit for bit: headless as fast
+as the CPU allows, or on screen with pong.py --replay.
+
+The file is a header (with the physics, floating or fixed point) followed by a stream of records written as the game
+goes. Each record is one byte, the type in the high nibble and the paddle inputs (left | right << 2) in the low one,
+followed by its argument. Consecutive steps with the same inputs are written as a single run record, so a recording
+takes a few bytes per input change no matter how long the match is. Fixed-point recordings replay the same on any
+machine, floating point ones only where the floats round the same.
+
+Usage: python recording.py recording [recording...]"""
+import hashlib
+import struct
+import sys
+import time
+
+from fixedpoint import FixedMatch
+from simulation import Direction, Match
+
+header = struct.Struct('<7sBQd')
+# the physics, 1 for fixed point: the rest of the header since version 2, version 1 recordings are all floating point
+physics_header = struct.Struct('<B')
+magic = b'PONGREC'
+version = 2
+steps_record, fast_forward_record, reset_record, speed_record = range(4)
+speed = struct.Struct('<d')
+direction_codes = {None: 0, Direction.Up: 1, Direction.Down: 2}
+directions = {code: direction for direction, code in direction_codes.items()}
+
+
+def write_varint(file, number):
+    """Unsigned LEB128: 7 bits per byte, the high bit set on every byte but the last."""
+    result = bytearray()
+    while number >= 0x80:
+        result.append(number & 0x7f | 0x80)
+        number >>= 7
+    result.append(number)
+    file.write(result)
+
+
+def read_varint(file):
+    number, shift = 0, 0
+    while True:
+        byte = file.read(1)
+        if not byte:
+            raise EOFError('Recording truncated in a varint')
+        number |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return number
+        shift += 7
+
+
+class Recorder(object):
+    """Streams a recording to path. Call step after every Match.step, fast_forward after every Match.fast_forward,
+    reset after Match.reset and speed when the speed multiplier changes, and close at the end."""
+
+    def __init__(self, path, seed, delta, fixed_point=False):
+        self.file = open(path, 'wb')
+        self.file.write(header.pack(magic, version, seed, delta) + physics_header.pack(fixed_point))
+        self.run_inputs = None
+        self.run_length = 0
+
+    def write(self, record_type, inputs=0):
+        self.file.write(bytes((record_type << 4 | inputs,)))
+
+    def end_run(self):
+        if self.run_length:
+            self.write(steps_record, self.run_inputs)
+            write_varint(self.file, self.run_length)
+        self.run_length = 0
+
+    def step(self, left_direction, right_direction):
+        inputs = direction_codes[left_direction] | direction_codes[right_direction] << 2
+        if inputs != self.run_inputs:
+            self.end_run()
+            self.run_inputs = inputs
+        self.run_length += 1
+
+    def fast_forward(self, steps, left_direction, right_direction):
+        self.end_run()
+        self.write(fast_forward_record, direction_codes[left_direction] | direction_codes[right_direction] << 2)
+        write_varint(self.file, steps)
+
+    def reset(self):
+        self.end_run()
+        self.write(reset_record)
+
+    def speed(self, multiplier):
+        self.end_run()
+        self.write(speed_record)
+        self.file.write(speed.pack(multiplier))
+
+    def close(self):
+        self.end_run()
+        self.file.close()
+
+
+class Recording(object):
+    """A recording opened for reading: seed, delta and fixed_point come from the header and records() yields the rest as
+        ('steps', left_direction, right_direction, count)
+        ('fast_forward', left_direction, right_direction, steps)
+        ('reset',)
+        ('speed', multiplier)
+    A recording cut short, say by a crash, is read up to its last whole record."""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        data = self.file.read(header.size)
+        if len(data) < header.size or data[:len(magic)] != magic:
+            self.file.close()
+            raise ValueError('{} is not a recording'.format(path))
+        _, file_version, self.seed, self.delta = header.unpack(data)
+        if file_version not in (1, version):
+            self.file.close()
+            raise ValueError('Unsupported recording version {}'.format(file_version))
+        self.fixed_point = False
+        if file_version >= 2:
+            data = self.file.read(physics_header.size)
+            if len(data) < physics_header.size:
+                self.file.close()
+                raise ValueError('{} is not a recording'.format(path))
+            self.fixed_point = bool(physics_header.unpack(data)[0])
+
+    def records(self):
+        file = self.file
+        try:
+            while True:
+                byte = file.read(1)
+                if not byte:
+                    return
+                record_type, inputs = byte[0] >> 4, byte[0] & 0xf
+                left, right = directions[inputs & 3], directions[inputs >> 2]
+                if record_type == steps_record:
+                    yield 'steps', left, right, read_varint(file)
+                elif record_type == fast_forward_record:
+                    yield 'fast_forward', left, right, read_varint(file)
+                elif record_type == reset_record:
+                    yield 'reset',
+                elif record_type == speed_record:
+                    data = file.read(speed.size)
+                    if len(data) < speed.size:
+                        return
+                    yield 'speed', speed.unpack(data)[0]
+                else:
+                    raise ValueError('Invalid record type {}'.format(record_type))
+        except EOFError:
+            return
+
+    def close(self):
+        self.file.close()
+
+
+def new_match(recording, on_event=None):
+    match = (FixedMatch if recording.fixed_point else Match)(seed=recording.seed, on_event=on_event)
+    match.delta = recording.delta
+    return match
+
+
+def actions(records):
+    """The records with their runs split into single steps, for replaying at the pace of a display: every action but
+    a speed change takes the physics steps apply() returns."""
+    for record in records:
+        if record[0] == 'steps':
+            step = ('step',) + record[1:3]
+            for _ in range(record[3]):
+                yield step
+        else:
+            yield record
+
+
+def apply(match, action):
+    """Play one action of actions() on match, returns the physics steps it took."""
+    kind = action[0]
+    if kind == 'step':
+        match.step(action[1], action[2])
+        return 1
+    if kind == 'fast_forward':
+        match.fast_forward(action[3] * match.delta, action[1], action[2])
+        return action[3]
+    if kind == 'reset':
+        match.reset()
+    return 0
+
+
+def replay(path, on_event=None):
+    """Replay a whole recording headless, as fast as possible. Returns the match and the physics steps taken."""
+    recording = Recording(path)
+    match = new_match(recording, on_event)
+    steps = 0
+    try:
+        for record in recording.records():
+            kind = record[0]
+            if kind == 'steps':
+                _, left_direction, right_direction, count = record
+                step = match.step
+                for _ in range(count):
+                    step(left_direction, right_direction)
+                steps += count
+            elif kind == 'fast_forward':
+                match.fast_forward(record[3] * match.delta, record[1], record[2])
+                steps += record[3]
+            elif kind == 'reset':
+                match.reset()
+    finally:
+        recording.close()
+    return match, steps
+
+
+def state_digest(match):
+    """A hash of everything that makes up the state of match, to check that two runs ended up exactly the same."""
+    state = [match.score, match.virtual_time, match.step_count, match.showing_winner_screen, match.delaying_kick_off,
+             match.kick_off_direction, match.kick_off_timer]
+    for sprite in match.ball, match.left_paddle, match.right_paddle:
+        state += [sprite.x, sprite.y, sprite.speed_x, sprite.speed_y]
+    return hashlib.sha1(repr(state).encode()).hexdigest()
+
+
+def main(argv):
+    for path in argv[1:]:
+        start = time.perf_counter()
+        match, steps = replay(path)
+        elapsed = time.perf_counter() - start
+        print('{}: {} steps in {:.2f} s ({:.0f} steps/s), score {}-{}, state {}'.format(
+            path, steps, elapsed, steps / elapsed if elapsed else 0, match.score[0], match.score[1],
+            state_digest(match)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,653 @@
+"""Pong simulation: the game state and fixed step physics, without a display, a mixer or fonts."""
+import math
+import random
+from collections import namedtuple
+from functools import partialmethod
+
+Position = namedtuple('Position', 'x y')
+Vector = namedtuple('Vector', 'x y')
+Size = namedtuple('Size', 'width height')
+Area = namedtuple('Area', 'position size')
+
+
+def pretty_float_pair(self, name, labels):
+    """If labels = ('a', 'b') and self = (1.2345, 1.2345) returns:
+        'name(a=1.23, b=1.23)'"""
+    return '{}({}={:.2f}, {}={:.2f})'.format(name, labels[0], self[0], labels[1], self[1])
+
+
+Position.__str__ = partialmethod(pretty_float_pair, 'Position', ('x', 'y'))
+Vector.__str__ = partialmethod(pretty_float_pair, 'Vector', ('x', 'y'))
+Size.__str__ = partialmethod(pretty_float_pair, 'Size', ('width', 'height'))
+
+
+class Direction:
+    Up = 0
+    Down = 1
+    Left = 2
+    Right = 3
+
+
+field_size = Size(width=180, height=100)
+constant_delta = 1 / 24 * 1000
+winning_score = 11
+hidden = Position(5000, 50)
+top_limit = 1.1
+bottom_limit = field_size.height - 1
+left_limit = 1.1
+right_limit = field_size.width - 1
+max_bounces = 8
+# how close the paddles get to the walls: more than the ball's height, so a ball between a wall and the end of a
+# paddle always fits through instead of being squeezed
+wall_clearance = 2
+
+
+def overlaps(position1, size1, position2, size2):
+    """True if the two areas share some surface, touching edges don't count."""
+    return (position1.x < position2.x + size2.width and position2.x < position1.x + size1.width and
+            position1.y < position2.y + size2.height and position2.y < position1.y + size1.height)
+
+
+class Sprite(object):
+    """Position, previous position, size and speed are kept as plain floats in slots and updated in place, so a physics
+    step doesn't create any objects. The namedtuple properties are for everything else.
+
+    speed_changes counts the bounces and kick offs, the only times the sprite changes course by itself, so anything
+    computed from its trajectory can be kept until it changes."""
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'speed_x', 'speed_y', 'last_draw_position',
+                 'speed_changes')
+
+    def __init__(self):
+        self.x = self.y = self.prev_x = self.prev_y = 0
+        self.width = self.height = 1
+        self.speed_x = self.speed_y = 0
+        self.last_draw_position = Position(0, 0)
+        self.speed_changes = 0
+
+    @property
+    def position(self):
+        return Position(self.x, self.y)
+
+    @position.setter
+    def position(self, position):
+        self.x, self.y = position
+
+    @property
+    def prev_position(self):
+        return Position(self.prev_x, self.prev_y)
+
+    @prev_position.setter
+    def prev_position(self, position):
+        self.prev_x, self.prev_y = position
+
+    @property
+    def size(self):
+        return Size(self.width, self.height)
+
+    @size.setter
+    def size(self, size):
+        self.width, self.height = size
+
+    @property
+    def speed(self):
+        return Vector(self.speed_x, self.speed_y)
+
+    @speed.setter
+    def speed(self, speed):
+        self.speed_x, self.speed_y = speed
+
+    def update(self, delta):
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.advance(delta)
+
+    def advance(self, time):
+        """Move in a straight line for time milliseconds, leaving the previous position alone."""
+        self.x += self.speed_x * time
+        self.y += self.speed_y * time
+
+    def interpolate_prev_position(self, alpha=1):
+        return Position(
+            self.x * alpha + self.prev_x * (1 - alpha),
+            self.y * alpha + self.prev_y * (1 - alpha))
+
+    def collides(self, sprite):
+        return overlaps(self.position, self.size, sprite.position, sprite.size)
+
+    def snapshot(self):
+        return (self.x, self.y, self.prev_x, self.prev_y, self.speed_x, self.speed_y, self.speed_changes)
+
+    def restore(self, snapshot):
+        self.x, self.y, self.prev_x, self.prev_y, self.speed_x, self.speed_y, self.speed_changes = snapshot
+
+    def bounce(self, angle):
+        """Bounce off a surface sloped an angle. The sprite must be at the point of impact already."""
+        cos, sin = reflections[angle] if angle in reflections else reflection(angle)
+        speed_x = self.speed_x
+        self.speed_x = speed_x * cos + self.speed_y * sin
+        self.speed_y = speed_x * sin - self.speed_y * cos
+        self.speed_changes += 1
+
+
+def time_of_impact(sprite, x, y, width, height, speed_x, speed_y, max_time):
+    """Swept collision of a sprite and a box at (x, y) of (width, height) moving at (speed_x, speed_y), both at constant
+    speed, in field coordinates. Returns (time, axis) of their first contact within max_time, where axis ('x' or 'y')
+    tells which of the box's faces was hit, or None if they don't touch. If they already overlap they touch at time 0
+    unless they are separating."""
+    # times when the sprite enters and leaves the box on each axis
+    relative = sprite.speed_x - speed_x
+    offset = sprite.x - x
+    if relative == 0:
+        if not -sprite.width < offset < width:
+            return None
+        x_enter = -math.inf
+        x_exit = math.inf
+    else:
+        x_enter = (-sprite.width - offset) / relative
+        x_exit = (width - offset) / relative
+        if x_enter > x_exit:
+            x_enter, x_exit = x_exit, x_enter
+        if x_exit <= 1e-9 or x_enter > max_time:
+            return None
+    relative = sprite.speed_y - speed_y
+    offset = sprite.y - y
+    if relative == 0:
+        if not -sprite.height < offset < height:
+            return None
+        y_enter = -math.inf
+        y_exit = math.inf
+    else:
+        y_enter = (-sprite.height - offset) / relative
+        y_exit = (height - offset) / relative
+        if y_enter > y_exit:
+            y_enter, y_exit = y_exit, y_enter
+    enter = max(x_enter, y_enter)
+    exit = min(x_exit, y_exit)
+    if enter >= exit or exit <= 1e-9 or enter > max_time:
+        return None
+    return max(enter, 0), 'x' if x_enter >= y_enter else 'y'
+
+
+def time_to_limit(position, speed, limit):
+    """Time until a coordinate moving towards limit reaches it, 0 if it's already past it."""
+    return max(0, (limit - position) / speed)
+
+
+def slope(vector):
+    return math.degrees(math.atan2(vector.y, vector.x))
+
+
+def reflection(surface_angle):
+    """The reflection off a surface sloped surface_angle is the matrix [[cos, sin], [sin, -cos]] of twice that angle,
+    this returns (cos, sin)."""
+    return math.cos(math.radians(2 * surface_angle)), math.sin(math.radians(2 * surface_angle))
+
+
+# the walls and the paddle parts are the only surfaces there are
+reflections = {angle: reflection(angle) for angle in (0, 80, 85, 90, 95, 100)}
+
+
+def reflect(vector, surface_angle):
+    # reflected_angle = 2 * surface_angle - incident_angle, which is what the reflection matrix does
+    cos, sin = reflections[surface_angle] if surface_angle in reflections else reflection(surface_angle)
+    return Vector(vector.x * cos + vector.y * sin, vector.x * sin - vector.y * cos)
+
+
+def center(target, size):
+    return target + size / 2
+
+
+class Paddle(Sprite):
+    __slots__ = ('min_speed', 'min_y', 'max_y')
+    # (offset from the top, height) of the paddle's parts, from top to bottom
+    parts = ((0, 1), (1, 1), (2, 4), (6, 1), (7, 1))
+    # (offset from the top, height, surface angle) of the parts in the order their collisions are checked: the edges
+    # (90 +- 10 degrees) first, then the ones next to them (90 +- 5) and the center (90)
+    collision_parts = ((0, 1, 100), (7, 1, 80), (1, 1, 95), (6, 1, 85), (2, 4, 90))
+
+    def __init__(self, x):
+        super().__init__()
+        self.size = Size(1, 8)
+        self.position = Position(x, center(field_size.height / 2, self.size.height))
+        self.prev_position = self.position
+        self.min_speed = 6 / 100
+        self.min_y = top_limit + wall_clearance
+        self.max_y = bottom_limit - wall_clearance - self.height
+
+    def paddle_parts_list(self, position=None):
+        x, y = position if position is not None else self.position
+        return [Area(Position(x, y + offset), Size(self.width, height)) for offset, height in self.parts]
+
+    def move(self, input_direction):
+        self.speed_x = 0
+        if input_direction == Direction.Up:
+            self.speed_y = -self.min_speed
+        elif input_direction == Direction.Down:
+            self.speed_y = self.min_speed
+        else:
+            self.speed_y = 0
+
+    def update(self, delta):
+        # restrict paddle movement
+        last_y = self.y
+        super().update(delta)
+        if self.y < self.min_y or self.y > self.max_y:
+            self.y = last_y
+
+    def free_speed_y(self):
+        """The vertical speed the paddle can actually move at: none if it's already at the limit it's moving towards."""
+        if self.speed_y < 0 and self.y <= self.min_y or self.speed_y > 0 and self.y >= self.max_y:
+            return 0
+        return self.speed_y
+
+    def time_to_stop(self, speed_y):
+        """Time until the paddle moving at speed_y reaches its limit."""
+        if speed_y < 0:
+            return time_to_limit(self.y, speed_y, self.min_y)
+        if speed_y > 0:
+            return time_to_limit(self.y, speed_y, self.max_y)
+        return math.inf
+
+    def reflection_angle(self, offset, height=1):
+        """Slope of the paddle part hit by a sprite of the given height whose top is offset below the paddle's top at
+        the moment of impact."""
+        for part_offset, part_height, angle in self.collision_parts:
+            if offset < part_offset + part_height and part_offset < offset + height:
+                return angle
+        raise ValueError("The sprite doesn't collide with the paddle")
+
+
+class Ball(Sprite):
+    __slots__ = ('rng', 'min_speed', 'min_speed_x')
+
+    def __init__(self, rng=random):
+        super().__init__()
+        self.rng = rng
+        self.size = Size(1, 1)
+        self.position = Position(
+            center(field_size.width / 2, self.width),
+            center(field_size.height / 2, self.height))
+        self.prev_position = self.position
+        self.min_speed = 4 / 100
+        # off a paddle, so it always gets somewhere
+        self.min_speed_x = self.min_speed / 2
+
+    def kick_off(self, direction):
+        """Kick off from the half line between 5% height from the border. If None direction
+        is given, one of the two (Left or Right) will be chosen randomly."""
+        self.x = center(field_size.width / 2, self.width)
+        self.y = (self.rng.random() * 0.9 + 0.05) * field_size.height
+        if direction is None:
+            direction = self.rng.choice([Direction.Left, Direction.Right])
+        if direction == Direction.Left:
+            self.speed_x = -self.min_speed
+            self.speed_y = (1 - 2 * self.rng.random()) * self.min_speed
+        if direction == Direction.Right:
+            self.speed_x = self.min_speed
+            self.speed_y = (1 - 2 * self.rng.random()) * self.min_speed
+        self.speed_changes += 1
+
+    def start_win_screen(self):
+        """Kick off from in between 5% from each border."""
+        self.x = (self.rng.random() * 0.9 + 0.05) * field_size.width
+        self.y = (self.rng.random() * 0.9 + 0.05) * field_size.height
+        self.speed_x = self.rng.choice([1, -1]) * self.min_speed
+        self.speed_y = self.rng.choice([1, -1]) * self.min_speed
+        self.speed_changes += 1
+
+
+def impossible_ai(paddle, ball):
+    """Follow the ball, with a little wiggle room to reduce shakiness."""
+    if center(paddle.y, paddle.height) < center(ball.y, ball.height) - 1.3:
+        return Direction.Down
+    elif center(paddle.y, paddle.height) > center(ball.y, ball.height) + 1.3:
+        return Direction.Up
+    else:
+        return None
+
+
+class Match(object):
+    """A whole game of pong: two paddles, a ball and the score. It advances in fixed physics steps of delta
+    milliseconds of virtual time, kick off delays included, so it doesn't need a clock or a display.
+
+    on_event is called with 'hit_wall', 'hit_paddle' or 'goal' so a front end can play sounds. event_log, if set, is an
+    eventlog.EventLog that gets the bounces, goals, kick offs and resets with their details.
+
+    The rules move the bodies, with the numbers and arithmetic below: here the bodies are the sprites themselves and
+    the numbers floats, fixedpoint.FixedMatch plays by the same rules with integers."""
+    rng_class = random.Random
+    top_limit, bottom_limit, left_limit, right_limit = top_limit, bottom_limit, left_limit, right_limit
+    forever = math.inf
+    hidden = hidden
+    left_start = Position(10, field_size.height / 2)
+    right_start = Position(170, field_size.height / 2)
+    first_kick_off_delay = 1000
+    goal_kick_off_delay = 2000
+    # the unit of the bodies' speeds in field units per millisecond
+    speed_unit = 1
+    time_of_impact = staticmethod(time_of_impact)
+    time_to_limit = staticmethod(time_to_limit)
+    root = staticmethod(math.sqrt)
+
+    def __init__(self, seed=None, on_event=None):
+        self.rng = self.rng_class(seed)
+        self.on_event = on_event
+        self.event_log = None
+        self.delta = constant_delta
+        self.left_paddle = Paddle(10)
+        self.right_paddle = Paddle(170)
+        self.ball = Ball(self.rng)
+        self.left_body, self.right_body, self.ball_body = self.bodies()
+        self.ball_body.kick_off(None)
+        self.score = (0, 0)
+        self.virtual_time = 0
+        self.step_count = 0
+        self.showing_winner_screen = False
+        self.delaying_kick_off = False
+        self.kick_off_direction = None
+        self.kick_off_timer = None
+
+    def emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def bodies(self):
+        """The left paddle's, the right paddle's and the ball's bodies."""
+        return self.left_paddle, self.right_paddle, self.ball
+
+    def publish(self):
+        """Bring the sprites up to date with the bodies, which they are."""
+
+    @property
+    def step_duration(self):
+        """A step in the bodies' unit of time."""
+        return self.delta
+
+    @staticmethod
+    def distance(speed, time):
+        return speed * time
+
+    @staticmethod
+    def velocity(distance, time):
+        return distance / time
+
+    def snapshot(self):
+        """Everything that changes as the match goes on, as a tuple, to restore() it later: to roll back and play some
+        steps again, for instance."""
+        return (self.rng.getstate(), self.score, self.virtual_time, self.step_count, self.showing_winner_screen,
+                self.delaying_kick_off, self.kick_off_direction, self.kick_off_timer, self.ball.snapshot(),
+                self.left_paddle.snapshot(), self.right_paddle.snapshot())
+
+    def restore(self, snapshot):
+        (rng_state, self.score, self.virtual_time, self.step_count, self.showing_winner_screen, self.delaying_kick_off,
+         self.kick_off_direction, self.kick_off_timer, ball, left_paddle, right_paddle) = snapshot
+        self.rng.setstate(rng_state)
+        self.ball.restore(ball)
+        self.left_paddle.restore(left_paddle)
+        self.right_paddle.restore(right_paddle)
+
+    def kick_off(self):
+        """The scheduled kick off."""
+        self.kick_off_timer = None
+        self.delaying_kick_off = False
+        self.ball_body.kick_off(self.kick_off_direction)
+        if self.event_log is not None:
+            self.publish()
+            self.event_log.kick_off(self.virtual_time, self.ball)
+
+    def schedule_kick_off(self, direction, delay):
+        """Kick off after delay, in the bodies' unit of time."""
+        self.delaying_kick_off = True
+        self.kick_off_direction = direction
+        self.kick_off_timer = delay
+
+    def reset(self):
+        """Start a new game after a one second delay."""
+        if self.event_log is not None:
+            self.event_log.reset(self.virtual_time)
+        self.showing_winner_screen = False
+        self.virtual_time = 0
+        self.score = (0, 0)
+        ball = self.ball_body
+        ball.speed_x = ball.speed_y = 0
+        ball.x, ball.y = self.hidden
+        self.left_body.x, self.left_body.y = self.left_start
+        self.right_body.x, self.right_body.y = self.right_start
+        self.schedule_kick_off(None, self.first_kick_off_delay)
+
+    def goal(self, score, direction):
+        if not self.delaying_kick_off:
+            self.score = score
+            self.emit('goal')
+            if self.event_log is not None:
+                self.event_log.goal(self.virtual_time, score)
+            self.schedule_kick_off(direction, self.goal_kick_off_delay)
+            ball = self.ball_body
+            ball.speed_x = ball.speed_y = 0
+            ball.x, ball.y = self.hidden
+
+    def paddle_impact(self, paddle, start_y, speed_y, max_time):
+        """The ball's collision within max_time with a paddle that starts at start_y and moves at speed_y, as
+        next_impact returns it."""
+        ball = self.ball_body
+        impact = self.time_of_impact(ball, paddle.x, start_y, paddle.width, paddle.height, 0, speed_y, max_time)
+        if impact is None:
+            return None
+        time, axis = impact
+        paddle_y = start_y + self.distance(speed_y, time)
+        if axis == 'y':
+            return time, 0, 'hit_paddle', paddle, paddle_y, speed_y
+        if paddle is self.left_body:
+            return time, 90, 'hit_paddle', paddle, None, None
+        offset = ball.y + self.distance(ball.speed_y, time) - paddle_y
+        return time, paddle.reflection_angle(offset, ball.height), 'hit_paddle', paddle, None, None
+
+    def next_impact(self, max_time, left_y, left_speed_y, right_y, right_speed_y):
+        """The ball's first collision within max_time as (time, surface angle, event, paddle, paddle y, paddle speed),
+        or None. The paddles start at left_y and right_y and move at left_speed_y and right_speed_y. paddle is the body
+        of the paddle hit, None for a wall, and the paddle's y and vertical speed at the moment of impact are only
+        given for hits on the top or bottom end of a paddle."""
+        ball = self.ball_body
+        time = self.forever
+        angle = 0
+        if ball.speed_y < 0:
+            time = self.time_to_limit(ball.y, ball.speed_y, self.top_limit)
+        elif ball.speed_y > 0:
+            time = self.time_to_limit(ball.y + ball.height, ball.speed_y, self.bottom_limit)
+        impact = None
+        if self.showing_winner_screen:
+            side = self.forever
+            if ball.speed_x < 0:
+                side = self.time_to_limit(ball.x, ball.speed_x, self.left_limit)
+            elif ball.speed_x > 0:
+                side = self.time_to_limit(ball.x + ball.width, ball.speed_x, self.right_limit)
+            if side < time:
+                time = side
+                angle = 90
+        else:
+            impact = self.paddle_impact(self.left_body, left_y, left_speed_y, max_time)
+            right = self.paddle_impact(self.right_body, right_y, right_speed_y, max_time)
+            if right is not None and (impact is None or right[0] < impact[0]):
+                impact = right
+        if impact is not None and impact[0] < time:
+            return impact
+        if time <= max_time:
+            return time, angle, 'hit_wall', None, None, None
+        return None
+
+    def hit(self, angle, event, paddle, paddle_y, paddle_speed_y):
+        """Bounce the ball, which is at the point of impact."""
+        ball = self.ball_body
+        speed_x, speed_y = ball.speed_x, ball.speed_y
+        ball.bounce(angle)
+        if paddle is not None:
+            self.leave_paddle(paddle, paddle_y, paddle_speed_y, self.root(speed_x * speed_x + speed_y * speed_y))
+        if not self.showing_winner_screen:
+            self.emit(event)
+        if self.event_log is not None:
+            unit = self.speed_unit
+            self.event_log.bounce(self.virtual_time, angle, speed_x / unit, speed_y / unit, ball.speed_x / unit,
+                                  ball.speed_y / unit)
+
+    def leave_paddle(self, paddle, paddle_y, paddle_speed_y, speed):
+        """Send the ball that just bounced off paddle on its way, at its speed before the hit or min_speed if that's
+        more. Off the face it moves away at min_speed_x at least, or a sloped part could leave it stuck to the paddle.
+        Off an end (at paddle_y) it moves away from the paddle at min_speed_x at least too, so a faster paddle doesn't
+        run it over or carry it along, and keeps min_speed_x horizontally."""
+        ball = self.ball_body
+        speed = max(speed, ball.min_speed)
+        min_speed_x = ball.min_speed_x
+        if paddle_y is None:
+            away = 1 if paddle is self.left_body else -1
+            if ball.speed_x * away >= min_speed_x:
+                return
+            ball.speed_x = away * min_speed_x
+            speed_y = self.root(max(0, speed * speed - min_speed_x * min_speed_x))
+            ball.speed_y = speed_y if ball.speed_y >= 0 else -speed_y
+            return
+        if ball.y < paddle_y:
+            speed_y = min(ball.speed_y, paddle_speed_y - min_speed_x)
+        else:
+            speed_y = max(ball.speed_y, paddle_speed_y + min_speed_x)
+        if speed_y == ball.speed_y and abs(ball.speed_x) >= min_speed_x:
+            return
+        ball.speed_y = speed_y
+        speed_x = max(min_speed_x, self.root(max(0, speed * speed - speed_y * speed_y)))
+        if ball.speed_x < 0 or ball.speed_x == 0 and paddle is self.right_body:
+            speed_x = -speed_x
+        ball.speed_x = speed_x
+
+    def move_ball(self):
+        """Move the ball a whole step, bouncing at the exact point of impact and using the rest of the step to move
+        away from it, never past the walls."""
+        ball, left, right = self.ball_body, self.left_body, self.right_body
+        distance = self.distance
+        ball.prev_x = ball.x
+        ball.prev_y = ball.y
+        # the paddles have already moved this step, sweep them from where they were
+        left_y, right_y = left.prev_y, right.prev_y
+        remaining = self.step_duration
+        left_speed_y = self.velocity(left.y - left_y, remaining)
+        right_speed_y = self.velocity(right.y - right_y, remaining)
+        bounces = 0
+        while bounces < max_bounces:
+            impact = self.next_impact(remaining, left_y, left_speed_y, right_y, right_speed_y)
+            if impact is None:
+                break
+            time = impact[0]
+            ball.advance(time)
+            left_y += distance(left_speed_y, time)
+            right_y += distance(right_speed_y, time)
+            self.hit(*impact[1:])
+            remaining -= time
+            bounces += 1
+        if bounces == max_bounces:
+            # out of bounces, stop short of whatever the ball would go through next
+            impact = self.next_impact(remaining, left_y, left_speed_y, right_y, right_speed_y)
+            if impact is not None:
+                remaining = impact[0]
+        ball.advance(remaining)
+        ball.y = min(max(ball.y, self.top_limit), self.bottom_limit - ball.height)
+
+    def check_goal(self):
+        if not self.showing_winner_screen:
+            ball = self.ball_body
+            if ball.x <= self.left_limit:
+                self.goal((self.score[0], self.score[1] + 1), Direction.Left)
+            if ball.x + ball.width >= self.right_limit:
+                self.goal((self.score[0] + 1, self.score[1]), Direction.Right)
+
+    def check_winner(self):
+        if self.score[0] == winning_score or self.score[1] == winning_score:
+            if not self.showing_winner_screen:
+                self.kick_off_timer = None
+                self.left_body.x, self.left_body.y = self.hidden
+                self.right_body.x, self.right_body.y = self.hidden
+                self.showing_winner_screen = True
+                self.ball_body.start_win_screen()
+
+    def step(self, left_direction, right_direction):
+        """Advance one fixed physics step with the given paddle inputs (a Direction or None each)."""
+        self.virtual_time += self.delta
+        self.step_count += 1
+        step_duration = self.step_duration
+        self.left_body.move(left_direction)
+        self.right_body.move(right_direction)
+        self.left_body.update(step_duration)
+        self.right_body.update(step_duration)
+        self.move_ball()
+        self.check_goal()
+        self.check_winner()
+        if self.kick_off_timer is not None:
+            self.kick_off_timer -= step_duration
+            if self.kick_off_timer <= 0:
+                self.kick_off()
+
+    def fast_forward(self, duration, left_direction=None, right_direction=None):
+        """Advance duration milliseconds of virtual time with constant paddle inputs, jumping from one event (a bounce,
+        a goal, a kick off or a paddle reaching its limit) to the next instead of taking fixed steps. In between events
+        everything moves in a straight line, so it's computed in closed form. Paddles stop exactly at their limits and
+        goals are scored right at the goal line, so the result is close to, but not the same as, stepping. step_count
+        goes up by the steps duration is worth, rounded."""
+        ball, left, right = self.ball, self.left_paddle, self.right_paddle
+        self.step_count += int(round(duration / self.delta))
+        left.move(left_direction)
+        right.move(right_direction)
+        remaining = duration
+        instant_events = 0
+        # however the ball gets stuck, a call handles no more impacts than the steps it's worth could
+        impacts = max_bounces * (int(duration / self.delta) + 1)
+        while remaining > 0:
+            left_speed_y, right_speed_y = left.free_speed_y(), right.free_speed_y()
+            time = min(remaining, left.time_to_stop(left_speed_y), right.time_to_stop(right_speed_y))
+            if not self.showing_winner_screen and not self.delaying_kick_off:
+                if ball.speed_x < 0:
+                    time = min(time, time_to_limit(ball.x, ball.speed_x, left_limit))
+                elif ball.speed_x > 0:
+                    time = min(time, time_to_limit(ball.x + ball.width, ball.speed_x, right_limit))
+            if self.kick_off_timer is not None:
+                time = min(time, max(0, self.kick_off_timer))
+            impact = None
+            # a ball squeezed between a wall and a paddle could bounce forever without time passing, or with impacts
+            # femtoseconds apart
+            if instant_events < max_bounces and impacts > 0:
+                impact = self.next_impact(time, left.y, left_speed_y, right.y, right_speed_y)
+            if impact is not None:
+                time = impact[0]
+                impacts -= 1
+            instant_events = instant_events + 1 if time <= 1e-9 else 0
+            ball.advance(time)
+            ball.y = min(max(ball.y, self.top_limit), self.bottom_limit - ball.height)
+            left.y = min(max(left.y + left_speed_y * time, left.min_y), left.max_y)
+            right.y = min(max(right.y + right_speed_y * time, right.min_y), right.max_y)
+            self.virtual_time += time
+            remaining -= time
+            if self.kick_off_timer is not None:
+                self.kick_off_timer -= time
+                if self.kick_off_timer <= 0:
+                    self.kick_off()
+                    continue
+            if impact is not None:
+                self.hit(*impact[1:])
+            self.check_goal()
+            self.check_winner()
+        for sprite in ball, left, right:
+            sprite.prev_x = sprite.x
+            sprite.prev_y = sprite.y
+
+    def run(self, n_steps, left_control=None, right_control=None):
+        """Advance n_steps physics steps. A control is called as control(paddle, ball) before every step and returns
+        the paddle's direction, no control means the paddle stands still."""
+        for _ in range(n_steps):
+            left_direction = left_control(self.left_paddle, self.ball) if left_control is not None else None
+            right_direction = right_control(self.right_paddle, self.ball) if right_control is not None else None
+            self.step(left_direction, right_direction)
+
+    def run_fast(self, duration, left_control=None, right_control=None, poll_interval=constant_delta):
+        """Like run, but fast forwarding: the controls are called every poll_interval milliseconds of virtual time, so
+        a longer interval means fewer events and a faster, coarser game."""
+        while duration > 0:
+            left_direction = left_control(self.left_paddle, self.ball) if left_control is not None else None
+            right_direction = right_control(self.right_paddle, self.ball) if right_control is not None else None
+            self.fast_forward(min(poll_interval, duration), left_direction, right_direction)
+            duration -= poll_interval
@@ -0,0 +1,89 @@
+"""Sound synthesis: simple waveforms with an optional linear envelope, rendered as raw mixer samples and cached in
+memory and on disk, so the game doesn't synthesize the same sounds on every launch.
+
+Only one period of the wave is computed sample by sample, the rest is repeated with bulk array operations and the
+envelope only touches the samples of its ramps."""
+import hashlib
+import math
+import os
+from array import array
+
+waveforms = ('square', 'triangle', 'sawtooth', 'sine')
+# mixer sample sizes (signed) and their array type codes
+type_codes = {8: 'b', 16: 'h', 32: 'i'}
+cache_directory = os.path.join(os.path.expanduser('~'), '.cache', 'pong', 'sounds')
+memory_cache = {}
+
+
+def one_period(waveform, frequency, sample_rate, amplitude):
+    period = int(round(sample_rate / frequency))
+    half = period // 2
+    if waveform == 'square':
+        return [amplitude] * (period - half) + [-amplitude] * half
+    elif waveform == 'triangle':
+        return [int(amplitude * (1 - 4 * abs((t / period + 0.25) % 1 - 0.5))) for t in range(period)]
+    elif waveform == 'sawtooth':
+        return [int(amplitude * (2 * t / period - 1)) for t in range(period)]
+    elif waveform == 'sine':
+        return [int(amplitude * math.sin(2 * math.pi * t / period)) for t in range(period)]
+    raise ValueError('Invalid waveform {}'.format(waveform))
+
+
+def samples(waveform, frequency, milliseconds, sample_rate, size=-16, channels=1, attack=0, release=0):
+    """At least milliseconds of the waveform, in whole periods, in the mixer format: size is the (signed) sample size in
+    bits as pygame.mixer.get_init() gives it and channels are interleaved. attack and release are the milliseconds of
+    the linear fade in and out."""
+    bits = abs(size)
+    if bits not in type_codes:
+        raise ValueError('Unsupported sample size {}'.format(size))
+    period = array(type_codes[bits], one_period(waveform, frequency, sample_rate, 2 ** (bits - 1) - 1))
+    copies = math.ceil(milliseconds / (len(period) / sample_rate * 1000))
+    result = period * copies
+    apply_envelope(result, sample_rate, attack, release)
+    if channels > 1:
+        interleaved = array(result.typecode, bytes(len(result) * channels * result.itemsize))
+        for channel in range(channels):
+            interleaved[channel::channels] = result
+        result = interleaved
+    return result
+
+
+def apply_envelope(result, sample_rate, attack, release):
+    attack_samples = min(len(result), int(sample_rate * attack / 1000))
+    for t in range(attack_samples):
+        result[t] = int(result[t] * t / attack_samples)
+    release_samples = min(len(result), int(sample_rate * release / 1000))
+    for t in range(release_samples):
+        result[-1 - t] = int(result[-1 - t] * t / release_samples)
+
+
+def cache_path(key):
+    return os.path.join(cache_directory, hashlib.sha1(repr(key).encode()).hexdigest() + '.raw')
+
+
+def cached_samples(waveform, frequency, milliseconds, sample_rate, size=-16, channels=1, attack=0, release=0):
+    """The raw bytes of samples(...), from memory, from the disk cache or synthesized and saved to both. The disk cache
+    is only an optimization: it's skipped when cache_directory is None or can't be used."""
+    key = (waveform, frequency, milliseconds, sample_rate, size, channels, attack, release)
+    if key in memory_cache:
+        return memory_cache[key]
+    result = None
+    if cache_directory is not None:
+        try:
+            with open(cache_path(key), 'rb') as cache_file:
+                result = cache_file.read()
+        except OSError:
+            pass
+    if result is None:
+        result = samples(*key).tobytes()
+        if cache_directory is not None:
+            try:
+                os.makedirs(cache_directory, exist_ok=True)
+                temporary = cache_path(key) + '.{}.tmp'.format(os.getpid())
+                with open(temporary, 'wb') as cache_file:
+                    cache_file.write(result)
+                os.replace(temporary, cache_path(key))
+            except OSError:
+                pass
+    memory_cache[key] = result
+    return result
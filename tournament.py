@@ -0,0 +1,119 @@
+"""AI tournament: every controller plays every other one (and itself) on both sides, many matches per pairing, spread
+over all the CPU cores with a process pool. Each match is seeded from the tournament seed and its number, so a
+tournament can be played again with the same results whatever the number of processes.
+
+Usage: python tournament.py [--controllers impossible,loose] [--matches 50] [--processes N] [--seed 0]
+                            [--max-minutes 10]"""
+import argparse
+import multiprocessing
+import sys
+import time
+from collections import namedtuple
+
+import controllers
+from simulation import Match, winning_score
+
+Result = namedtuple('Result', 'left right winner score rallies steps')
+
+
+def play(task):
+    """Play one match to the end, or until max_steps, display free. Returns a Result: winner is 'left', 'right' or None
+    if nobody won in time and rallies has the paddle hits before each goal, plus the last rally's if it was cut
+    short."""
+    left_name, right_name, seed, max_steps = task
+    rallies = []
+    hits = [0]
+
+    def on_event(event):
+        if event == 'hit_paddle':
+            hits[0] += 1
+        elif event == 'goal':
+            rallies.append(hits[0])
+            hits[0] = 0
+
+    match = Match(seed=seed, on_event=on_event)
+    left_control, right_control = controllers.make(left_name), controllers.make(right_name)
+    left_paddle, right_paddle, ball = match.left_paddle, match.right_paddle, match.ball
+    while not match.showing_winner_screen and match.step_count < max_steps:
+        match.step(left_control(left_paddle, ball), right_control(right_paddle, ball))
+    if hits[0]:
+        # the rally that was cut short
+        rallies.append(hits[0])
+    winner = None
+    if match.score[0] == winning_score:
+        winner = 'left'
+    elif match.score[1] == winning_score:
+        winner = 'right'
+    return Result(left_name, right_name, winner, match.score, rallies, match.step_count)
+
+
+def tasks(names, matches, seed, max_steps):
+    number = 0
+    for left in names:
+        for right in names:
+            for _ in range(matches):
+                yield left, right, seed * 1000003 + number, max_steps
+                number += 1
+
+
+def run(names, matches, seed=0, max_steps=14400, processes=None):
+    """Play the tournament, returns the results of every match and the seconds it took."""
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = list(pool.imap_unordered(play, tasks(names, matches, seed, max_steps), chunksize=4))
+    return results, time.perf_counter() - start
+
+
+def table(results, elapsed):
+    """The results by pairing and by controller (against the other controllers, a controller always wins against
+    itself), and the tournament's throughput."""
+    pairings = {}
+    for result in results:
+        pairings.setdefault((result.left, result.right), []).append(result)
+    lines = ['{:16} {:16} {:>7} {:>7} {:>7} {:>7} {:>8} {:>6}'.format(
+        'left', 'right', 'matches', 'left%', 'right%', 'unfin%', 'rally', 'max')]
+    for (left, right), played in sorted(pairings.items()):
+        rallies = [rally for result in played for rally in result.rallies]
+        lines.append('{:16} {:16} {:7} {:7.1%} {:7.1%} {:7.1%} {:8.2f} {:6}'.format(
+            left, right, len(played),
+            sum(result.winner == 'left' for result in played) / len(played),
+            sum(result.winner == 'right' for result in played) / len(played),
+            sum(result.winner is None for result in played) / len(played),
+            sum(rallies) / len(rallies) if rallies else 0, max(rallies, default=0)))
+    lines += ['', '{:16} {:>7} {:>7}'.format('controller', 'played', 'win%')]
+    names = sorted({result.left for result in results} | {result.right for result in results})
+    for name in names:
+        played = wins = 0
+        for result in results:
+            if result.left != result.right and name in (result.left, result.right):
+                played += 1
+                wins += (result.winner == 'left' and result.left == name or
+                         result.winner == 'right' and result.right == name)
+        lines.append('{:16} {:7} {:7.1%}'.format(name, played, wins / played if played else 0))
+    steps = sum(result.steps for result in results)
+    lines += ['', '{} matches in {:.2f} s: {:.1f} matches/s, {:.0f} steps/s'.format(
+        len(results), elapsed, len(results) / elapsed, steps / elapsed)]
+    return '\n'.join(lines)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Pong AI tournament')
+    parser.add_argument('--controllers', default=','.join(sorted(controllers.factories)),
+                        help='comma separated controller names, from: ' + ', '.join(sorted(controllers.factories)))
+    parser.add_argument('--matches', type=int, default=50, help='matches per pairing')
+    parser.add_argument('--processes', type=int, help='worker processes, all CPU cores by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-minutes', type=float, default=10,
+                        help='virtual minutes after which an unfinished match is stopped')
+    args = parser.parse_args(argv[1:])
+    names = args.controllers.split(',')
+    for name in names:
+        if name not in controllers.factories:
+            parser.error('unknown controller {}'.format(name))
+    max_steps = int(args.max_minutes * 60 * 1000 / Match().delta)
+    results, elapsed = run(names, args.matches, args.seed, max_steps, args.processes)
+    print(table(results, elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv)